@@ -0,0 +1,57 @@
+"""Microbenchmark: legacy handle_command lookup vs the compiled CommandIndex.
+
+Run from the repository root:  python benchmarks/bench_dispatch.py
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dispatch import CommandIndex
+
+
+def legacy_dispatch(commands_db, text):
+    command = text.split()[0]
+    args = text.split()[1:]
+    for category, cmds in commands_db.items():
+        if command in cmds:
+            cmd_template = cmds[command]
+            for i, arg in enumerate(args):
+                cmd_template = cmd_template.replace(f"{{{'param'+str(i+1)}}}", arg)
+            return cmd_template
+    return None
+
+
+def synthetic_db(categories, placeholders):
+    """commands.json-shaped dict where the hot command lives in the last category"""
+    fields = " ".join("{arg%d}" % i for i in range(placeholders))
+    db = {}
+    for c in range(categories):
+        db[f"category{c}"] = {f"cmd{c}_{n}": f"cmd{c} {n} {fields}" for n in range(20)}
+    db[f"category{categories - 1}"]["hot"] = f"hot {fields}"
+    return db
+
+
+def bench(label, commands_db, text, number=20000):
+    index = CommandIndex(commands_db)
+    legacy = timeit.timeit(lambda: legacy_dispatch(commands_db, text), number=number)
+    compiled = timeit.timeit(lambda: index.dispatch(text), number=number)
+    print(f"{label:<32} legacy {legacy / number * 1e6:7.2f} us   indexed {compiled / number * 1e6:7.2f} us")
+
+
+def main():
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    with open(os.path.join(root, "commands.json"), "r") as f:
+        commands_db = json.load(f)
+    bench("commands.json: pay", commands_db, "pay Steve 100")
+    bench("commands.json: nation create", commands_db, "nation create Rome")
+    for categories in (5, 50, 500):
+        for placeholders in (1, 8):
+            args = " ".join(f"value{i}" for i in range(placeholders))
+            bench(f"{categories} categories, {placeholders} args", synthetic_db(categories, placeholders), f"hot {args}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Memory of loaded towny_data: plain dicts vs slotted records (model.py).
+
+Run from the repository root:  python benchmarks/bench_memory.py [--sizes 10000 100000]
+
+Entities are decoded one row at a time the way TownyStore.load() does it,
+so names are not shared between dicts unless the model interns them.
+Memory is what tracemalloc sees allocated by the load. Load and scan
+times come from a separate untraced run.
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from datagen import generate
+from model import Model
+from serializer import Serializer
+from storage import SECTIONS
+
+
+def rows_for(data, serializer):
+    return {section: [(key, serializer.dumps(value)) for key, value in data[section].items()] for section in SECTIONS}
+
+
+def load_dicts(rows, serializer):
+    loads = serializer.loads
+    return {section: {key: loads(value) for key, value in section_rows} for section, section_rows in rows.items()}
+
+
+def load_records(rows, serializer):
+    loads = serializer.loads
+    model = Model()
+    record, intern = model.record, model.key
+    sections = {
+        section: {intern(section, key): record(section, loads(value)) for key, value in section_rows}
+        for section, section_rows in rows.items()
+    }
+    return model, sections
+
+
+def measure(load):
+    gc.collect()
+    tracemalloc.start()
+    result = load()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    gc.collect()
+    start = time.perf_counter()
+    result = load()
+    return size, time.perf_counter() - start, scan(result)
+
+
+def scan(sections):
+    """Touch every town the way the indexes do, to compare read cost"""
+    start = time.perf_counter()
+    total = 0
+    for town in sections["towns"].values():
+        total += town.get("balance") or 0
+        total += len(town.get("residents", ()))
+        town.get("nation")
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+    serializer = Serializer()
+
+    for towns in args.sizes:
+        data = generate(towns)
+        rows = rows_for(data, serializer)
+        del data
+        print(f"\n{towns:,} towns, {len(rows['players']):,} players")
+        print(f"{'model':<10}{'memory':>12}{'per town':>12}{'load':>10}{'scan':>10}")
+        results = {}
+        for label, load in (("dict", lambda: load_dicts(rows, serializer)),
+                            ("slotted", lambda: load_records(rows, serializer)[1])):
+            size, elapsed, scan_time = measure(load)
+            results[label] = size
+            print(f"{label:<10}{size / 1e6:>10.1f}MB{size / towns:>10.0f} B{elapsed:>9.2f}s{scan_time * 1000:>8.1f}ms")
+        print(f"slotted uses {results['slotted'] / results['dict']:.0%} of the dict model's memory")
+
+
+if __name__ == "__main__":
+    main()
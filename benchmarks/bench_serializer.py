@@ -0,0 +1,139 @@
+"""Save/load times of towny_data with each installed JSON backend.
+
+Run from the repository root:  python benchmarks/bench_serializer.py [--sizes 1000 10000 100000]
+
+"legacy" is the old save_towny_data(): stdlib json with indent=2.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from datagen import generate
+from serializer import Serializer, available_backends
+from storage import atomic_write
+
+if msgspec is not None:
+    # Typed records for decoding straight into structs instead of dicts, to
+    # compare with the dict backends. Unknown fields are dropped.
+
+    class PlayerRecord(msgspec.Struct, omit_defaults=True):
+        town: Optional[str] = None
+        balance: float = 0
+
+    class TownRecord(msgspec.Struct, omit_defaults=True):
+        name: str = ""
+        mayor: Optional[str] = None
+        balance: float = 0
+        residents_count: int = 0
+        residents: List[str] = []
+        claims: int = 0
+        nation: Optional[str] = None
+        founded_date: Optional[str] = None
+
+    class NationRecord(msgspec.Struct, omit_defaults=True):
+        name: str = ""
+        king: Optional[str] = None
+        balance: float = 0
+        towns_count: int = 0
+        capital: Optional[str] = None
+        allies: List[str] = []
+        enemies: List[str] = []
+
+    class SiegeRecord(msgspec.Struct, omit_defaults=True):
+        attacker: Optional[str] = None
+        defender: Optional[str] = None
+        duration: float = 0
+        war_chest: float = 0
+        banner_control: Optional[str] = None
+        status: Optional[str] = None
+
+    class TownyDocument(msgspec.Struct):
+        players: Dict[str, PlayerRecord] = {}
+        towns: Dict[str, TownRecord] = {}
+        nations: Dict[str, NationRecord] = {}
+        sieges: Dict[str, SiegeRecord] = {}
+
+
+def typed_decoder():
+    """msgspec decoder producing typed records for a whole towny_data document"""
+    if msgspec is None:
+        raise RuntimeError("Typed decoding needs msgspec installed")
+    return msgspec.json.Decoder(TownyDocument)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def bench_file(path, dump, load):
+    save_time, size = timed(lambda: dump(path))
+    load_time, _ = timed(lambda: load(path))
+    return save_time, load_time, size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, "towny_data.json")
+
+    for towns in args.sizes:
+        data = generate(towns)
+        print(f"\n{towns:,} towns, {len(data['players']):,} players")
+        print(f"{'format':<22}{'save':>10}{'load':>10}{'size':>12}")
+
+        def legacy_dump(p):
+            with open(p, 'w') as f:
+                json.dump(data, f, indent=2)
+            return os.path.getsize(p)
+
+        def legacy_load(p):
+            with open(p, 'r') as f:
+                return json.load(f)
+
+        rows = [("legacy json indent=2", legacy_dump, legacy_load)]
+        for backend in available_backends():
+            for compact in (True, False):
+                serializer = Serializer(backend, compact)
+
+                def dump(p, serializer=serializer):
+                    atomic_write(p, serializer.dumps(data))
+                    return os.path.getsize(p)
+
+                def load(p, serializer=serializer):
+                    with open(p, 'rb') as f:
+                        return serializer.loads(f.read())
+
+                rows.append((f"{backend} {'compact' if compact else 'indent'}", dump, load))
+        try:
+            decoder = typed_decoder()
+
+            def typed_load(p):
+                with open(p, 'rb') as f:
+                    return decoder.decode(f.read())
+
+            rows.append(("msgspec typed", rows[1][1], typed_load))
+        except RuntimeError:
+            pass
+
+        for label, dump, load in rows:
+            save_time, load_time, size = bench_file(path, dump, load)
+            print(f"{label:<22}{save_time * 1000:>8.0f}ms{load_time * 1000:>8.0f}ms{size / 1e6:>10.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Check ChatIngestor against sample Towny and SiegeWar output.
+
+Run from the repository root:  python benchmarks/check_ingest.py
+
+Each sample is the command the bot sent and the lines the server replied
+with, the way they arrive in chat. Exits non-zero if any parsed entity
+does not match what the sample says.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ingest import ChatIngestor
+from storage import TownyStore
+
+SAMPLES = [
+    # Towny subcommands must not take the status screens below
+    ("/town claim", []),
+    ("/nation leave", []),
+    ("/towny-info", []),
+    ("/town Alpha", [
+        ".oOo.__________[ Alpha (Northreach) ]__________.oOo.",
+        "Mayor: Steve",
+        "Town Size: 300 / 480 [Bonus: 32]",
+        "Founded: Mar 14 2024",
+        "Bank: $5,000.50",
+        "Residents [3]: Steve, Alex, Notch",
+        "<Herobrine> anyone selling iron?",
+    ]),
+    # Answered out of order, each screen goes to the command that named it
+    ("/town Beta", []),
+    ("/nation Northreach", [
+        ".oOo.__________[ Northreach ]__________.oOo.",
+        "King: Steve",
+        "Capital: Alpha",
+        "Bank: $12,345",
+        "Towns [2]: Alpha, Beta",
+        "Allies: Southmark",
+        "Enemies: None",
+    ]),
+    ("/siege info Gamma", [
+        ".oOo.__________[ Gamma ]__________.oOo.",
+        "Attacker: Northreach",
+        "Status: In Progress",
+        "Banner Control: Attackers",
+        "War Chest: $1,500",
+    ]),
+    ("/town list", [
+        ".oOo.__________[ Town List ]__________.oOo.",
+        "Alpha (3), Beta (12)",
+        "Page 1 of 1",
+    ]),
+    ("/siege list", [
+        ".oOo.__________[ Siege List ]__________.oOo.",
+        "Northreach vs Gamma - In Progress",
+        "Page 1 of 1",
+    ]),
+]
+
+EXPECTED = {
+    ("towns", "Alpha"): {
+        "nation": "Northreach", "mayor": "Steve", "claims": 300, "founded_date": "Mar 14 2024",
+        "residents": ["Steve", "Alex", "Notch"], "residents_count": 3,
+    },
+    ("towns", "Beta"): {"nation": "Northreach", "residents_count": 12},
+    ("players", "Alex"): {"town": "Alpha"},
+    ("nations", "Northreach"): {
+        "king": "Steve", "capital": "Alpha", "towns_count": 2, "allies": ["Southmark"], "enemies": [],
+    },
+    ("sieges", "Gamma"): {
+        "attacker": "Northreach", "status": "In Progress", "banner_control": "Attackers", "war_chest": 1500.0,
+    },
+}
+EXPECTED_BALANCES = {("towns", "Alpha"): 5000.5, ("nations", "Northreach"): 12345.0}
+
+
+def main():
+    store = TownyStore(os.path.join(tempfile.mkdtemp(), "ingest.db"), legacy_path=None)
+    balances = {}
+    ingestor = ChatIngestor(
+        store, reply_timeout=0,
+        on_balances=lambda section, values: balances.update({(section, k): v for k, v in values.items()})
+    )
+    for command, lines in SAMPLES:
+        ingestor.command_sent(command)
+        for line in lines:
+            ingestor.parse_line(line)
+    ingestor.flush()
+
+    failures = []
+    for (section, key), fields in EXPECTED.items():
+        entity = store.get_entity(section, key) or {}
+        for field, value in fields.items():
+            if entity.get(field) != value:
+                failures.append(f"{section}/{key} {field}: expected {value!r}, got {entity.get(field)!r}")
+        if "balance" in entity:
+            failures.append(f"{section}/{key} balance was written to the store instead of on_balances")
+    if balances != EXPECTED_BALANCES:
+        failures.append(f"balances: expected {EXPECTED_BALANCES!r}, got {balances!r}")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    # Only /town Beta is still waiting for its screen
+    waiting = [(kind, name) for sent, kind, name in ingestor._expected]
+    if waiting != [("town_status", "beta")]:
+        failures.append(f"commands still waiting for a reply: {waiting!r}")
+    print(f"{len(SAMPLES)} commands, {len(failures)} mismatches")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Synthetic towny_data generator for benchmarks and load tests.
+
+    python benchmarks/datagen.py --towns 100000 -o towny_data.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+
+def generate(towns=1000, seed=0):
+    """towny_data-shaped dict with about 8 residents per town, one nation per 10 towns and one siege per 100"""
+    rng = random.Random(seed)
+    data = {"players": {}, "towns": {}, "nations": {}, "sieges": {}}
+    nation_names = [f"Nation{i}" for i in range(max(1, towns // 10))]
+    for nation in nation_names:
+        data["nations"][nation] = {
+            "name": nation,
+            "king": None,
+            "balance": rng.randrange(100000),
+            "towns_count": 0,
+            "capital": None,
+            "allies": rng.sample(nation_names, min(2, len(nation_names))),
+            "enemies": rng.sample(nation_names, min(1, len(nation_names))),
+        }
+    player_id = 0
+    for i in range(towns):
+        name = f"Town{i}"
+        residents = []
+        for _ in range(rng.randint(1, 15)):
+            player = f"Player{player_id}"
+            player_id += 1
+            residents.append(player)
+            data["players"][player] = {"town": name, "balance": rng.randrange(5000)}
+        nation = rng.choice(nation_names) if rng.random() < 0.7 else None
+        data["towns"][name] = {
+            "name": name,
+            "mayor": residents[0],
+            "balance": rng.randrange(50000),
+            "residents_count": len(residents),
+            "residents": residents,
+            "claims": rng.randint(1, 200),
+            "nation": nation,
+            "founded_date": f"20{rng.randint(20, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        }
+        if nation:
+            info = data["nations"][nation]
+            info["towns_count"] += 1
+            if info["capital"] is None:
+                info["capital"] = name
+                info["king"] = residents[0]
+    for i in range(towns // 100):
+        defender = f"Town{rng.randrange(towns)}"
+        data["sieges"][defender] = {
+            "attacker": rng.choice(nation_names),
+            "defender": defender,
+            "duration": rng.randint(1, 48),
+            "war_chest": rng.randrange(10000),
+            "banner_control": rng.choice(["Attacker", "Defender", "None"]),
+            "status": rng.choice(["Ongoing", "Attacker Win", "Defender Win"]),
+        }
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--towns", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default="-")
+    args = parser.parse_args()
+    data = generate(args.towns, args.seed)
+    if args.output == "-":
+        json.dump(data, sys.stdout)
+    else:
+        with open(args.output, "w") as f:
+            json.dump(data, f)
+        print(f"Wrote {args.towns} towns, {len(data['players'])} players to {args.output} "
+              f"({os.path.getsize(args.output) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Local stand-ins for mineflayer and discord.py so main.py runs without network access.
+
+install() must run before main is imported.
+"""
+import asyncio
+import sys
+import threading
+import time
+import types
+
+
+class FakeChatMessage:
+    def __init__(self, text):
+        self.text = text
+
+    def toString(self):
+        return self.text
+
+
+class FakeMinecraftBot:
+    """mineflayer Bot that records what is said and lets the test emit events"""
+
+    instances = []
+
+    def __init__(self, options):
+        self.options = options
+        self.handlers = {}
+        self.sent = []
+        self.on_chat = None
+        self._lock = threading.Lock()
+        FakeMinecraftBot.instances.append(self)
+
+    def on(self, event):
+        def register(handler):
+            self.handlers.setdefault(event, []).append(handler)
+            return handler
+        return register
+
+    def emit(self, event, *args):
+        for handler in self.handlers.get(event, []):
+            handler(*args)
+
+    def chat(self, message):
+        now = time.perf_counter()
+        with self._lock:
+            self.sent.append((now, message))
+        if self.on_chat is not None:
+            self.on_chat(message, now)
+
+    def quit(self):
+        self.emit('end')
+
+    def replay(self, lines, rate, on_line=None):
+        """Emit each line as a chat message, rate lines per second (0 = as fast as possible).
+
+        on_line(line) is called right before each line is emitted.
+        """
+        interval = 1.0 / rate if rate else 0
+        start = time.perf_counter()
+        for i, line in enumerate(lines):
+            if interval:
+                delay = start + i * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            if on_line is not None:
+                on_line(line)
+            self.emit('message', FakeChatMessage(line))
+
+
+class FakeEmbed:
+    def __init__(self, title=None, description=None, color=None):
+        self.title = title
+        self.description = description
+        self.color = color
+        self.fields = []
+        self.footer = None
+
+    def add_field(self, name, value, inline=True):
+        self.fields.append({"name": name, "value": value, "inline": inline})
+        return self
+
+    def set_footer(self, text=None):
+        self.footer = text
+        return self
+
+
+class FakeFile:
+    def __init__(self, fp, filename=None):
+        self.fp = fp
+        self.filename = filename
+
+
+class FakeCommand:
+    def __init__(self, name, callback):
+        self.name = name
+        self.callback = callback
+
+
+class FakeContext:
+    """Just enough of discord.ext.commands.Context for the bot's commands"""
+
+    def __init__(self, bot, command, channel="towny-commands", roles=("Admin",)):
+        self.bot = bot
+        self.command = command
+        self.command_failed = False
+        self.channel = types.SimpleNamespace(name=channel)
+        self.author = types.SimpleNamespace(
+            roles=[types.SimpleNamespace(name=role) for role in roles],
+            send=self.send,
+            __str__=lambda: "LoadTest"
+        )
+        self.message = types.SimpleNamespace(add_reaction=self._noop)
+        self.replies = []
+        self.replied = asyncio.Event()
+
+    async def _noop(self, *args, **kwargs):
+        pass
+
+    async def send(self, content=None, embed=None, file=None):
+        self.replies.append(embed or content)
+        self.replied.set()
+
+
+class FakeDiscordBot:
+    """commands.Bot that keeps registered commands and can invoke them like the gateway would"""
+
+    def __init__(self, command_prefix=None, intents=None, help_command=None):
+        self.commands = {}
+        self.events = {}
+        self.user = "LoadTestBot"
+        self._before = None
+        self._after = None
+        self._closed = asyncio.Event()
+
+    def command(self, name=None):
+        def register(callback):
+            self.commands[name or callback.__name__] = FakeCommand(name or callback.__name__, callback)
+            return callback
+        return register
+
+    def event(self, callback):
+        self.events[callback.__name__] = callback
+        return callback
+
+    def before_invoke(self, callback):
+        self._before = callback
+        return callback
+
+    def after_invoke(self, callback):
+        self._after = callback
+        return callback
+
+    async def invoke(self, name, *args, **ctx_options):
+        """Run a command the way discord.ext does: before hook, command, after hook"""
+        command = self.commands[name]
+        ctx = FakeContext(self, command, **ctx_options)
+        if self._before:
+            await self._before(ctx)
+        try:
+            await command.callback(ctx, *args)
+        except Exception:
+            ctx.command_failed = True
+            raise
+        finally:
+            if self._after:
+                await self._after(ctx)
+        return ctx
+
+    async def change_presence(self, activity=None):
+        pass
+
+    def get_all_channels(self):
+        return []
+
+    async def start(self, token):
+        await self._closed.wait()
+
+    async def close(self):
+        self._closed.set()
+
+
+def install():
+    """Register fake mineflayer and discord modules in sys.modules"""
+    mineflayer = types.ModuleType("mineflayer")
+    mineflayer.Bot = FakeMinecraftBot
+
+    discord = types.ModuleType("discord")
+    discord.Embed = FakeEmbed
+    discord.File = FakeFile
+    discord.Game = lambda name=None: types.SimpleNamespace(name=name)
+    discord.Intents = types.SimpleNamespace(default=lambda: types.SimpleNamespace())
+    discord.utils = types.SimpleNamespace(
+        get=lambda items, **attrs: next(
+            (item for item in items if all(getattr(item, k, None) == v for k, v in attrs.items())), None
+        )
+    )
+    ext = types.ModuleType("discord.ext")
+    commands = types.ModuleType("discord.ext.commands")
+    commands.Bot = FakeDiscordBot
+    ext.commands = commands
+    discord.ext = ext
+
+    sys.modules["mineflayer"] = mineflayer
+    sys.modules["discord"] = discord
+    sys.modules["discord.ext"] = ext
+    sys.modules["discord.ext.commands"] = commands
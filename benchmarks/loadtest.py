@@ -0,0 +1,368 @@
+"""Load test: main.py against local stand-ins for Minecraft and Discord.
+
+Runs in a scratch directory with a generated towny_data.json, replays chat
+through a fake mineflayer bot, fires Discord commands concurrently and hits
+the panel, then reports throughput and p50/p99 latency per scenario.
+
+Run from the repository root:  python benchmarks/loadtest.py --towns 10000
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.abspath(ROOT))
+
+import fakes
+from datagen import generate
+
+CHAT_LINES = ["<{player}> anyone selling iron?", "<{player}> gg", "{player} joined the game"]
+COMMANDS = ["!pay {player} {amount}", "!town join {town}", "!siege info {town}", "!tpa {player}"]
+REPLY_BLOCK = [".oOo.__________[ Town List ]__________.oOo.", "{town} ({amount}), {other} (3)", "Page 1 of 1"]
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class Result:
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.elapsed = 0.0
+        self.errors = 0
+        self.note = ""
+
+    def row(self):
+        count = len(self.latencies)
+        return {
+            "scenario": self.name,
+            "count": count,
+            "errors": self.errors,
+            "per_sec": count / self.elapsed if self.elapsed else 0.0,
+            "p50_ms": percentile(self.latencies, 50) * 1000,
+            "p99_ms": percentile(self.latencies, 99) * 1000,
+            "note": self.note,
+        }
+
+
+def prepare(directory, towns, seed, chat_rate):
+    """Scratch directory with config.json, commands.json and a generated towny_data.json"""
+    with open(os.path.join(ROOT, "config.json")) as f:
+        config = json.load(f)
+    config["minecraft"].update(chat_rate=chat_rate, chat_burst=max(4, chat_rate), chat_queue_size=100000)
+    config["towny"]["auto_save"] = 3600
+    with open(os.path.join(directory, "config.json"), "w") as f:
+        json.dump(config, f)
+    shutil.copy(os.path.join(ROOT, "commands.json"), directory)
+    with open(os.path.join(directory, "towny_data.json"), "w") as f:
+        json.dump(generate(towns, seed), f)
+
+
+def child_startup():
+    """Import main in this process (cwd is a prepared directory) and print how long it took"""
+    sys.path.insert(0, os.path.abspath(ROOT))
+    fakes.install()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main
+        main.towny_data.count("towns")
+        main.towny_index.find_town("Town0")
+    print(time.perf_counter() - start)
+
+
+def run_startup(args):
+    """Each run imports main in a fresh process against a fresh towny_data.json (migration included)"""
+    result = Result("startup")
+    start = time.perf_counter()
+    for run in range(args.startup_runs):
+        with tempfile.TemporaryDirectory() as directory:
+            prepare(directory, args.towns, args.seed + run, args.chat_rate)
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child-startup"],
+                cwd=directory, capture_output=True, text=True
+            )
+            if output.returncode:
+                result.errors += 1
+                print(output.stderr, file=sys.stderr)
+                continue
+            result.latencies.append(float(output.stdout.strip().splitlines()[-1]))
+    result.elapsed = time.perf_counter() - start
+    result.note = f"{args.towns} towns from JSON"
+    return result
+
+
+def synthetic_chat(main, count, rng):
+    towns = main.towny_data.count("towns")
+    players = main.towny_data.count("players")
+    lines = []
+    while len(lines) < count:
+        values = {
+            "player": f"Player{rng.randrange(players)}",
+            "town": f"Town{rng.randrange(towns)}",
+            "other": f"Town{rng.randrange(towns)}",
+            "amount": rng.randint(1, 500),
+        }
+        roll = rng.random()
+        if roll < 0.5:
+            lines.append(rng.choice(CHAT_LINES).format(**values))
+        elif roll < 0.9:
+            lines.append(rng.choice(COMMANDS).format(**values))
+        else:
+            lines.extend(line.format(**values) for line in REPLY_BLOCK)
+    return lines[:count]
+
+
+def run_minecraft(main, args, rng):
+    """Replay chat into every server's bot, command latency is message in to command out"""
+    result = Result("minecraft commands")
+    if args.replay:
+        with open(args.replay, encoding="utf-8") as f:
+            lines = [line.rstrip("\n") for line in f if line.strip()]
+    else:
+        lines = synthetic_chat(main, int(args.rate * args.duration), rng)
+
+    prefix = main.config["prefix"]
+    pending = {}
+    lock = threading.Lock()
+
+    def on_chat(message, sent_at):
+        with lock:
+            # Commands are never coalesced, each send answers the oldest identical one
+            waiting = pending.get(message)
+            if waiting:
+                result.latencies.append(sent_at - waiting.pop(0))
+                if not waiting:
+                    del pending[message]
+
+    def on_line(line):
+        if not line.startswith(prefix):
+            return
+        match = main.command_index.resolve(line[len(prefix):].split())
+        if match:
+            with lock:
+                pending.setdefault(f"/{match[0].format(match[1])}", []).append(time.perf_counter())
+
+    bots = []
+    for server in main.server_pool:
+        server.bot = main.MinecraftBot(server)
+        server.bot.connect_minecraft()
+        server.bot.bot.emit('spawn')
+        server.bot.bot.on_chat = on_chat
+        server.chat_queue.start()
+        server.ingestor.start()
+        bots.append(server.bot.bot)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=bot.replay, args=(lines, args.rate, on_line)) for bot in bots]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    deadline = time.perf_counter() + args.drain
+    while pending and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    result.elapsed = time.perf_counter() - start
+    with lock:
+        result.errors = sum(len(times) for times in pending.values())
+    for server in main.server_pool:
+        server.ingestor.flush()
+        server.chat_queue.stop()
+        server.ingestor.stop()
+    result.note = f"{len(lines)} lines x {len(bots)} servers at {args.rate:g}/s"
+    return result
+
+
+DISCORD_COMMANDS = [
+    ("town", "{town}"),
+    ("town", "top"),
+    ("nation", "{nation}"),
+    ("siege", "{town}"),
+    ("help",),
+    ("ledger", "town", "{town}"),
+    ("stats", "{town}"),
+]
+
+
+async def run_discord(main, args, rng):
+    """Invoke Discord commands through the before/after hooks, concurrency at a time"""
+    result = Result("discord commands")
+    bot = main.DiscordBot()
+    main.discord_bot = bot
+    towns = main.towny_data.count("towns")
+    nations = main.towny_data.count("nations")
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def invoke(name, *params):
+        async with semaphore:
+            values = {"town": f"Town{rng.randrange(towns)}", "nation": f"Nation{rng.randrange(max(1, nations))}"}
+            start = time.perf_counter()
+            try:
+                await bot.bot.invoke(name, *(param.format(**values) for param in params))
+            except Exception as e:
+                result.errors += 1
+                if result.errors == 1:
+                    print(f"❌ !{name}: {e!r}", file=sys.stderr)
+                return
+            result.latencies.append(time.perf_counter() - start)
+
+    calls = [rng.choice(DISCORD_COMMANDS) for _ in range(args.discord_commands)]
+    start = time.perf_counter()
+    await asyncio.gather(*(invoke(*call) for call in calls))
+    result.elapsed = time.perf_counter() - start
+    result.note = f"{args.concurrency} concurrent"
+    return result
+
+
+def run_panel(main, args, rng):
+    """GET the panel and the towns API from a thread pool, changing a town every writes_every requests"""
+    result = Result("panel")
+    client = main.app.test_client()
+    towns = main.towny_data.count("towns")
+    paths = ["/", "/api/towns"]
+    counter = [0]
+    lock = threading.Lock()
+
+    def request(i):
+        if args.writes_every and i % args.writes_every == 0:
+            town = f"Town{rng.randrange(towns)}"
+            main.towny_data.update("towns", town, {"balance": rng.randrange(50000)})
+        start = time.perf_counter()
+        response = client.get(paths[i % len(paths)])
+        elapsed = time.perf_counter() - start
+        with lock:
+            if response.status_code >= 400:
+                result.errors += 1
+            else:
+                result.latencies.append(elapsed)
+                counter[0] += len(response.data)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(request, range(args.panel_requests)))
+    result.elapsed = time.perf_counter() - start
+    result.note = f"{args.concurrency} concurrent, {counter[0] / max(1, len(result.latencies)) / 1e3:.0f} kB avg"
+    return result
+
+
+def run_saves(main, args, rng):
+    """save_towny_data() after changing changes_per_save towns each time"""
+    result = Result("saves")
+    towns = main.towny_data.count("towns")
+    for _ in range(args.saves):
+        main.towny_data.update_many("towns", {
+            f"Town{rng.randrange(towns)}": {"balance": rng.randrange(50000)}
+            for _ in range(args.changes_per_save)
+        })
+        start = time.perf_counter()
+        main.save_towny_data()
+        elapsed = time.perf_counter() - start
+        result.latencies.append(elapsed)
+        result.elapsed += elapsed
+    result.note = f"{args.changes_per_save} changed towns each"
+    return result
+
+
+def report(results):
+    print(f"{'scenario':<20} {'count':>7} {'errors':>6} {'per sec':>10} {'p50 ms':>9} {'p99 ms':>9}  note")
+    for result in results:
+        row = result.row()
+        print(f"{row['scenario']:<20} {row['count']:>7} {row['errors']:>6} {row['per_sec']:>10.1f} "
+              f"{row['p50_ms']:>9.2f} {row['p99_ms']:>9.2f}  {row['note']}")
+
+
+def compare(rows, baseline_path, tolerance):
+    """Scenarios whose p99 got more than tolerance slower than in the baseline file"""
+    with open(baseline_path) as f:
+        baseline = {row["scenario"]: row for row in json.load(f)}
+    regressions = []
+    for row in rows:
+        before = baseline.get(row["scenario"])
+        if before and before["p99_ms"] and row["p99_ms"] > before["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{row['scenario']}: p99 {before['p99_ms']:.2f} -> {row['p99_ms']:.2f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--towns", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rate", type=float, default=500, help="chat lines per second per server, 0 = unthrottled")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of synthetic chat")
+    parser.add_argument("--replay", help="file of recorded chat lines to replay instead of synthetic chat")
+    parser.add_argument("--chat-rate", type=float, default=1000, help="outbound chat queue rate")
+    parser.add_argument("--drain", type=float, default=10, help="seconds to wait for queued commands to go out")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--discord-commands", type=int, default=2000)
+    parser.add_argument("--panel-requests", type=int, default=500)
+    parser.add_argument("--writes-every", type=int, default=10, help="panel requests per town change, 0 = read only")
+    parser.add_argument("--saves", type=int, default=20)
+    parser.add_argument("--changes-per-save", type=int, default=100)
+    parser.add_argument("--startup-runs", type=int, default=3)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file from an earlier run, exit 1 on p99 regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--child-startup", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child_startup:
+        child_startup()
+        return
+
+    results = [run_startup(args)] if args.startup_runs else []
+    rng = random.Random(args.seed)
+    directory = tempfile.mkdtemp(prefix="towny-loadtest-")
+    cwd = os.getcwd()
+    try:
+        prepare(directory, args.towns, args.seed, args.chat_rate)
+        os.chdir(directory)
+        fakes.install()
+        with contextlib.redirect_stdout(io.StringIO()):
+            import main as towny
+
+            async def run_all():
+                loop = asyncio.get_running_loop()
+                results.append(await loop.run_in_executor(None, run_minecraft, towny, args, rng))
+                results.append(await run_discord(towny, args, rng))
+                results.append(await loop.run_in_executor(None, run_panel, towny, args, rng))
+                results.append(await loop.run_in_executor(None, run_saves, towny, args, rng))
+
+            asyncio.run(run_all())
+            for server in towny.server_pool:
+                server.store.close()
+            towny.ledger.close()
+            towny.chat_log.close()
+            towny.admin_log.close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    report(results)
+    rows = [result.row() for result in results]
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+    if args.baseline:
+        regressions = compare(rows, args.baseline, args.tolerance)
+        for line in regressions:
+            print(f"❌ {line}")
+        if regressions:
+            sys.exit(1)
+        print("✅ No p99 regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Stress test for TownyStore: concurrent panel writes, log appends, readers and saves.
+
+Run from the repository root:  python benchmarks/stress_state.py [seconds]
+
+Exits non-zero if any thread raised or the saved database does not match
+memory afterwards.
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from events import EventBroker
+from indexes import TownyIndex
+from logbook import LogBook
+from storage import TownyStore
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    workdir = tempfile.mkdtemp()
+    store = TownyStore(os.path.join(workdir, "stress.db"), legacy_path=None)
+    admin_log = LogBook(os.path.join(workdir, "logs"), "admin", max_bytes=256 * 1024)
+    index = TownyIndex(store)
+    broker = EventBroker()
+    store.subscribe(lambda section, key, value: broker.publish("data", {"section": section}))
+    for i in range(2000):
+        store.set("towns", f"Town{i}", {"name": f"Town{i}", "balance": i, "residents": [f"Player{i}"]})
+
+    stop = threading.Event()
+    errors = []
+    counts = {"writes": 0, "deletes": 0, "logs": 0, "saves": 0, "snapshots": 0, "lookups": 0}
+
+    def worker(name, func):
+        def run():
+            try:
+                while not stop.is_set():
+                    func()
+                    counts[name] += 1
+            except Exception as e:
+                errors.append(f"{name}: {e!r}")
+                stop.set()
+        return threading.Thread(target=run, name=name)
+
+    def panel_write():
+        name = f"Town{random.randrange(2500)}"
+        store.update("towns", name, {"name": name, "balance": random.randrange(100000)})
+
+    def panel_delete():
+        store.delete("towns", f"Town{random.randrange(2500)}")
+        time.sleep(0.001)
+
+    def log_append():
+        entry = admin_log.append({"time": time.strftime("%Y-%m-%d %H:%M:%S"), "action": "stress", "user": "bench"})
+        broker.publish("admin_log", entry)
+
+    def save():
+        store.save()
+        time.sleep(0.01)
+
+    def snapshot():
+        towns = store.snapshot("towns")
+        # Every entity must be a complete, consistent dict
+        for town in towns.values():
+            town["balance"]
+        admin_log.latest(10)
+
+    def lookup():
+        index.top_towns(10)
+        index.search_towns("town1", 10)
+        index.find_town(f"town{random.randrange(2500)}")
+
+    threads = [worker("writes", panel_write) for _ in range(4)]
+    threads += [worker("deletes", panel_delete), worker("logs", log_append), worker("logs", log_append)]
+    threads += [worker("saves", save), worker("snapshots", snapshot), worker("lookups", lookup)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    store.save()
+    admin_log.close()
+    memory = store.snapshot("towns")
+    store.close()
+    reopened = TownyStore(os.path.join(workdir, "stress.db"), legacy_path=None)
+    on_disk = reopened.snapshot("towns")
+    if memory != on_disk:
+        errors.append(f"saved towns differ from memory ({len(memory)} vs {len(on_disk)})")
+    indexed = sorted(index.towns.names.values())
+    if indexed != sorted(memory):
+        errors.append("town index out of sync with store")
+
+    for name, value in counts.items():
+        print(f"{name:<10} {value:>10} ({value / duration:,.0f}/s)")
+    if errors:
+        print("❌ " + "\n❌ ".join(errors))
+        sys.exit(1)
+    print("✅ No errors, saved state matches memory")
+
+
+if __name__ == "__main__":
+    main()
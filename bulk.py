@@ -0,0 +1,173 @@
+import csv
+import io
+import math
+import threading
+import time
+from collections import deque
+
+from dispatch import CommandUsageError
+
+# Admin commands whose value is an amount of money
+AMOUNT_COMMANDS = ("give_balance", "set_balance")
+CSV_HEADER = ["command", "target", "value"]
+
+
+def parse_batch(text=None, items=None):
+    """[{command, target, value}] from CSV text (header optional) or a JSON list"""
+    if text is not None:
+        rows = [row for row in csv.reader(io.StringIO(text)) if row and any(cell.strip() for cell in row)]
+        if rows and [cell.strip().lower() for cell in rows[0]] == CSV_HEADER:
+            rows = rows[1:]
+        items = [dict(zip(CSV_HEADER, (cell.strip() for cell in row))) for row in rows]
+    batch = []
+    for item in items or []:
+        if not isinstance(item, dict):
+            item = dict(zip(CSV_HEADER, item)) if isinstance(item, (list, tuple)) else {}
+        batch.append({
+            "command": str(item.get("command") or "").strip(),
+            "target": str(item.get("target") or "").strip(),
+            "value": str(item.get("value") if item.get("value") is not None else "").strip()
+        })
+    return batch
+
+
+def validate_batch(batch, command_index):
+    """Check every item, returns (operations, errors).
+
+    Operations are the items plus the server command ("message") and the
+    parsed "amount" of money commands. Nothing should run unless errors is
+    empty; errors are {"line", "error"} with 1-based lines.
+    """
+    operations, errors = [], []
+    for line, item in enumerate(batch, 1):
+        command = item["command"]
+        compiled = command_index.get("admin", command)
+        if compiled is None:
+            errors.append({"line": line, "error": f"Unknown admin command '{command}'"})
+            continue
+        args = [item["target"], item["value"]][:len(compiled.fields)]
+        problem = None
+        for field, arg in zip(compiled.fields, args):
+            if not arg:
+                problem = f"Missing {field}"
+            elif any(c.isspace() for c in arg):
+                problem = f"{field} must be a single word"
+            if problem:
+                break
+        amount = None
+        if problem is None and command in AMOUNT_COMMANDS:
+            try:
+                amount = float(item["value"])
+            except ValueError:
+                problem = "Amount must be a number"
+            else:
+                if not math.isfinite(amount) or amount < 0 or (command == "give_balance" and amount == 0):
+                    problem = "Amount must be positive"
+        if problem is None:
+            try:
+                message = f"/{compiled.format(args)}"
+            except CommandUsageError as e:
+                problem = str(e)
+        if problem:
+            errors.append({"line": line, "error": f"{command}: {problem}"})
+            continue
+        operations.append(dict(item, message=message, amount=amount))
+    return operations, errors
+
+
+class BulkRun:
+    """The in-game commands of one bulk request, fed to a server's chat queue.
+
+    Only window messages wait in the queue at a time and the next one goes
+    in as each is sent, so a batch of thousands never fills the queue or
+    crowds out players' commands, and the queue's rate limit paces it.
+    Identical commands are queued and sent once each. on_progress(run, item)
+    is called from the sender thread whenever an item is sent or dropped;
+    message_sent and message_dropped are the chat queue's listeners.
+    """
+
+    def __init__(self, id, server, messages, chat_queue, priority, window=20, on_progress=None):
+        self.id = id
+        self.server = server
+        self.items = [{"index": i, "message": message, "status": "pending"} for i, message in enumerate(messages)]
+        self.chat_queue = chat_queue
+        self.priority = priority
+        self.window = window
+        self.on_progress = on_progress
+        self.sent = 0
+        self.failed = 0
+        self.started = time.time()
+        self.finished = None
+        self._next = 0
+        self._in_flight = {}
+        self._queued = 0
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self.sent + self.failed == len(self.items)
+
+    def start(self):
+        with self._lock:
+            updated = self._feed()
+        self._report(updated)
+
+    def _feed(self):
+        """Queue items until the window is full, returns the ones that were dropped"""
+        dropped = []
+        while self._queued < self.window and self._next < len(self.items):
+            item = self.items[self._next]
+            self._next += 1
+            if self.chat_queue.put(item["message"], self.priority):
+                self._in_flight.setdefault(item["message"], deque()).append(item)
+                self._queued += 1
+                item["status"] = "queued"
+            else:
+                item["status"] = "dropped"
+                self.failed += 1
+                dropped.append(item)
+        return dropped
+
+    def _settle(self, message, status):
+        """Mark the oldest item waiting on message, returns it and whatever _feed() dropped"""
+        with self._lock:
+            waiting = self._in_flight.get(message)
+            if not waiting:
+                return []
+            item = waiting.popleft()
+            if not waiting:
+                del self._in_flight[message]
+            self._queued -= 1
+            item["status"] = status
+            if status == "sent":
+                self.sent += 1
+            else:
+                self.failed += 1
+            return [item] + self._feed()
+
+    def message_sent(self, message):
+        self._report(self._settle(message, "sent"))
+
+    def message_dropped(self, message):
+        self._report(self._settle(message, "dropped"))
+
+    def _report(self, items):
+        if self.done and self.finished is None:
+            self.finished = time.time()
+        if self.on_progress is not None:
+            for item in items:
+                self.on_progress(self, item)
+
+    def state(self):
+        with self._lock:
+            return {
+                "id": self.id,
+                "server": self.server,
+                "total": len(self.items),
+                "sent": self.sent,
+                "failed": self.failed,
+                "queued": self._queued,
+                "started": self.started,
+                "finished": self.finished,
+                "items": [dict(item) for item in self.items]
+            }
@@ -0,0 +1,190 @@
+import heapq
+import itertools
+import threading
+import time
+
+PRIORITY_ADMIN = 0
+PRIORITY_COMMAND = 1
+PRIORITY_CHAT = 2
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Consume a token, or return how many seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class ChatQueue:
+    """Single outbound queue for everything the bot says in game.
+
+    Messages are sent in priority order through a token bucket so bursts
+    don't trip the server spam filter. Identical pending chat messages are
+    coalesced; commands have side effects and are always sent as often as
+    they were queued, unless put() is told they are idempotent. While
+    get_bot() returns None (disconnected) messages are kept until the bot
+    is back.
+    """
+
+    def __init__(self, get_bot, rate=1.0, burst=4, max_size=500):
+        self.get_bot = get_bot
+        self.bucket = TokenBucket(rate, burst)
+        self.max_size = max_size
+        self._heap = []
+        # Live entries by seq, and the coalescable ones by message
+        self._pending = {}
+        self._coalescable = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        # Called with each message after it was sent, from the sender thread
+        self.on_sent = None
+        # Called with a queued message that was evicted to make room for a more urgent one
+        self.on_dropped = None
+        self.stats = {
+            "enqueued": 0,
+            "sent": 0,
+            "coalesced": 0,
+            "dropped": 0,
+            "send_errors": 0,
+            "max_depth": 0,
+            "total_wait": 0.0,
+            "max_wait": 0.0,
+        }
+
+    def put(self, message, priority=PRIORITY_CHAT, idempotent=None):
+        """Queue a message, returns False if it was dropped because the queue is full.
+
+        idempotent messages are merged with an identical pending one, it
+        defaults to True for relayed chat only.
+        """
+        if idempotent is None:
+            idempotent = priority == PRIORITY_CHAT
+        evicted = None
+        with self._cond:
+            entry = self._coalescable.get(message) if idempotent else None
+            if entry is not None:
+                self.stats["coalesced"] += 1
+                if priority < entry[0]:
+                    self._cancel(entry)
+                    self._push(priority, entry[1], message, entry[3], True)
+                return True
+            if len(self._pending) >= self.max_size:
+                evicted = self._evict_for(priority)
+                if evicted is None:
+                    self.stats["dropped"] += 1
+                    return False
+            self._push(priority, next(self._seq), message, time.monotonic(), idempotent)
+            self.stats["enqueued"] += 1
+            self.stats["max_depth"] = max(self.stats["max_depth"], len(self._pending))
+            self._cond.notify()
+        # Outside the lock, the listener may queue something else
+        if evicted is not None and self.on_dropped is not None:
+            self.on_dropped(evicted)
+        return True
+
+    def _push(self, priority, seq, message, enqueued_at, idempotent):
+        entry = [priority, seq, message, enqueued_at, idempotent]
+        self._pending[seq] = entry
+        if idempotent:
+            self._coalescable[message] = entry
+        heapq.heappush(self._heap, entry)
+
+    def _forget(self, entry):
+        del self._pending[entry[1]]
+        if entry[4]:
+            del self._coalescable[entry[2]]
+
+    def _cancel(self, entry):
+        """Take a live entry out of the queue, its heap slot is skipped later"""
+        self._forget(entry)
+        entry[2] = None
+
+    def _evict_for(self, priority):
+        """Drop the least urgent message if it is less urgent than priority, returns it or None"""
+        worst = max(self._pending.values(), key=lambda e: (e[0], e[1]))
+        if worst[0] <= priority:
+            return None
+        message = worst[2]
+        self._cancel(worst)
+        self.stats["dropped"] += 1
+        return message
+
+    def _pop(self):
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if entry[2] is not None:
+                self._forget(entry)
+                return entry
+        return None
+
+    def depth(self):
+        return len(self._pending)
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats["depth"] = len(self._pending)
+        stats["avg_wait"] = stats["total_wait"] / stats["sent"] if stats["sent"] else 0.0
+        return stats
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+                if not self._running:
+                    return
+            bot = self.get_bot()
+            if bot is None:
+                # Disconnected, keep everything queued until the bot is back
+                time.sleep(1)
+                continue
+            wait = self.bucket.take()
+            if wait:
+                time.sleep(wait)
+                continue
+            with self._cond:
+                entry = self._pop()
+            if entry is None:
+                continue
+            priority, seq, message, enqueued_at, idempotent = entry
+            try:
+                bot.chat(message)
+            except Exception as e:
+                print(f"❌ Chat send failed: {e}")
+                self.stats["send_errors"] += 1
+                with self._cond:
+                    if not (idempotent and message in self._coalescable):
+                        self._push(priority, seq, message, enqueued_at, idempotent)
+                time.sleep(1)
+                continue
+            if self.on_sent is not None:
+                self.on_sent(message)
+            waited = time.monotonic() - enqueued_at
+            self.stats["sent"] += 1
+            self.stats["total_wait"] += waited
+            self.stats["max_wait"] = max(self.stats["max_wait"], waited)
@@ -0,0 +1,267 @@
+import os
+import struct
+import sys
+import threading
+import zlib
+from array import array
+
+from storage import atomic_write
+
+REGION_SHIFT = 5
+REGION_SIZE = 1 << REGION_SHIFT
+REGION_MASK = REGION_SIZE - 1
+REGION_CELLS = REGION_SIZE * REGION_SIZE
+
+MAGIC = b"TCLM"
+FORMAT_VERSION = 1
+
+
+class Region:
+    """32x32 chunk tile, cells hold town ids (0 = wilderness)"""
+
+    __slots__ = ("cells", "count")
+
+    def __init__(self, cells=None, count=0):
+        self.cells = cells if cells is not None else array('I', bytes(4 * REGION_CELLS))
+        self.count = count
+
+
+def _split(x, z):
+    return (x >> REGION_SHIFT, z >> REGION_SHIFT), (x & REGION_MASK) | ((z & REGION_MASK) << REGION_SHIFT)
+
+
+class ClaimIndex:
+    """Chunk -> town ownership per world, stored as region-tiled id arrays.
+
+    Point lookups and claims are O(1) and bounding boxes only touch the
+    regions they overlap. Towns are stored by integer id with a name table.
+    """
+
+    def __init__(self):
+        self.worlds = {}
+        self.town_ids = {}
+        self.town_names = [None]
+        self.town_counts = [0]
+        self._free_ids = []
+        self.dirty = False
+        self._lock = threading.RLock()
+
+    # Town ids
+
+    def _town_id(self, town):
+        town_id = self.town_ids.get(town)
+        if town_id is None:
+            if self._free_ids:
+                town_id = self._free_ids.pop()
+                self.town_names[town_id] = town
+            else:
+                town_id = len(self.town_names)
+                self.town_names.append(town)
+                self.town_counts.append(0)
+            self.town_ids[town] = town_id
+        return town_id
+
+    def _release(self, town_id):
+        town = self.town_names[town_id]
+        if town is not None and self.town_counts[town_id] == 0:
+            del self.town_ids[town]
+            self.town_names[town_id] = None
+            self._free_ids.append(town_id)
+
+    # Updates
+
+    def claim(self, world, x, z, town):
+        """Give chunk (x, z) to town, returns the previous owner"""
+        region_key, cell = _split(x, z)
+        with self._lock:
+            town_id = self._town_id(town)
+            regions = self.worlds.setdefault(world, {})
+            region = regions.get(region_key)
+            if region is None:
+                region = regions[region_key] = Region()
+            previous = region.cells[cell]
+            if previous == town_id:
+                return town
+            region.cells[cell] = town_id
+            if previous:
+                self.town_counts[previous] -= 1
+                previous_name = self.town_names[previous]
+                self._release(previous)
+            else:
+                region.count += 1
+                previous_name = None
+            self.town_counts[town_id] += 1
+            self.dirty = True
+            return previous_name
+
+    def unclaim(self, world, x, z):
+        """Return chunk (x, z) to the wilderness, returns the previous owner"""
+        region_key, cell = _split(x, z)
+        with self._lock:
+            region = self.worlds.get(world, {}).get(region_key)
+            if region is None or not region.cells[cell]:
+                return None
+            town_id = region.cells[cell]
+            region.cells[cell] = 0
+            region.count -= 1
+            if not region.count:
+                del self.worlds[world][region_key]
+            self.town_counts[town_id] -= 1
+            town = self.town_names[town_id]
+            self._release(town_id)
+            self.dirty = True
+            return town
+
+    def remove_town(self, town):
+        """Unclaim everything a town owns, returns the number of chunks freed"""
+        with self._lock:
+            town_id = self.town_ids.get(town)
+            if town_id is None:
+                return 0
+            freed = 0
+            for world, regions in self.worlds.items():
+                for region_key, region in list(regions.items()):
+                    cells = region.cells
+                    if town_id not in cells:
+                        continue
+                    for cell in range(REGION_CELLS):
+                        if cells[cell] == town_id:
+                            cells[cell] = 0
+                            freed += 1
+                            region.count -= 1
+                    if not region.count:
+                        del regions[region_key]
+            self.town_counts[town_id] = 0
+            self._release(town_id)
+            self.dirty = self.dirty or bool(freed)
+            return freed
+
+    # Queries
+
+    def owner(self, world, x, z):
+        region_key, cell = _split(x, z)
+        region = self.worlds.get(world, {}).get(region_key)
+        if region is None:
+            return None
+        return self.town_names[region.cells[cell]]
+
+    def claim_count(self, town):
+        town_id = self.town_ids.get(town)
+        return self.town_counts[town_id] if town_id else 0
+
+    def neighbours(self, world, x, z):
+        """Owners of the four chunks sharing an edge with (x, z)"""
+        return {
+            (nx, nz): self.owner(world, nx, nz)
+            for nx, nz in ((x + 1, z), (x - 1, z), (x, z + 1), (x, z - 1))
+        }
+
+    def is_adjacent(self, world, x, z, town):
+        """Whether town owns a chunk next to (x, z), as Towny requires for new claims"""
+        return town in self.neighbours(world, x, z).values()
+
+    def query_box(self, world, x0, z0, x1, z1):
+        """All claimed chunks with x0 <= x <= x1 and z0 <= z <= z1 as (x, z, town)"""
+        regions = self.worlds.get(world, {})
+        results = []
+        names = self.town_names
+        with self._lock:
+            for rx in range(x0 >> REGION_SHIFT, (x1 >> REGION_SHIFT) + 1):
+                for rz in range(z0 >> REGION_SHIFT, (z1 >> REGION_SHIFT) + 1):
+                    region = regions.get((rx, rz))
+                    if region is None:
+                        continue
+                    base_x, base_z = rx << REGION_SHIFT, rz << REGION_SHIFT
+                    cells = region.cells
+                    for lz in range(max(z0 - base_z, 0), min(z1 - base_z, REGION_MASK) + 1):
+                        row = lz << REGION_SHIFT
+                        for lx in range(max(x0 - base_x, 0), min(x1 - base_x, REGION_MASK) + 1):
+                            town_id = cells[row | lx]
+                            if town_id:
+                                results.append((base_x + lx, base_z + lz, names[town_id]))
+        return results
+
+    def __len__(self):
+        return sum(region.count for regions in self.worlds.values() for region in regions.values())
+
+    # Persistence
+
+    def to_bytes(self):
+        with self._lock:
+            parts = [MAGIC, struct.pack('<HI', FORMAT_VERSION, len(self.town_names) - 1)]
+            for name, count in zip(self.town_names[1:], self.town_counts[1:]):
+                encoded = (name or "").encode('utf-8')
+                parts.append(struct.pack('<HI', len(encoded), count))
+                parts.append(encoded)
+            parts.append(struct.pack('<I', len(self.worlds)))
+            for world, regions in self.worlds.items():
+                encoded = world.encode('utf-8')
+                parts.append(struct.pack('<HI', len(encoded), len(regions)))
+                parts.append(encoded)
+                for (rx, rz), region in regions.items():
+                    cells = region.cells
+                    if sys.byteorder != 'little':
+                        cells = array('I', cells)
+                        cells.byteswap()
+                    parts.append(struct.pack('<iiH', rx, rz, region.count))
+                    parts.append(cells.tobytes())
+        return zlib.compress(b"".join(parts), 6)
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = zlib.decompress(data)
+        if data[:4] != MAGIC:
+            raise ValueError("Not a claim index file")
+        version, town_count = struct.unpack_from('<HI', data, 4)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported claim index version {version}")
+        index = cls()
+        pos = 10
+        for town_id in range(1, town_count + 1):
+            length, count = struct.unpack_from('<HI', data, pos)
+            pos += 6
+            name = data[pos:pos + length].decode('utf-8') or None
+            pos += length
+            index.town_names.append(name)
+            index.town_counts.append(count)
+            if name is None:
+                index._free_ids.append(town_id)
+            else:
+                index.town_ids[name] = town_id
+        (world_count,) = struct.unpack_from('<I', data, pos)
+        pos += 4
+        region_bytes = 4 * REGION_CELLS
+        for _ in range(world_count):
+            length, region_count = struct.unpack_from('<HI', data, pos)
+            pos += 6
+            world = data[pos:pos + length].decode('utf-8')
+            pos += length
+            regions = index.worlds[world] = {}
+            for _ in range(region_count):
+                rx, rz, count = struct.unpack_from('<iiH', data, pos)
+                pos += 10
+                cells = array('I')
+                cells.frombytes(data[pos:pos + region_bytes])
+                pos += region_bytes
+                if sys.byteorder != 'little':
+                    cells.byteswap()
+                regions[(rx, rz)] = Region(cells, count)
+        return index
+
+    def save(self, path):
+        if not self.dirty:
+            return False
+        self.dirty = False
+        try:
+            atomic_write(path, self.to_bytes())
+        except Exception:
+            self.dirty = True
+            raise
+        return True
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
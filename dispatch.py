@@ -0,0 +1,93 @@
+import string
+
+# Extra words players can use to pick a category explicitly, e.g. "!town create X"
+CATEGORY_ALIASES = {"town": "towny"}
+
+
+class CommandUsageError(ValueError):
+    pass
+
+
+class CompiledCommand:
+    """A commands.json template compiled to a positional format string"""
+
+    __slots__ = ("category", "name", "template", "fields", "_format")
+
+    def __init__(self, category, name, template):
+        self.category = category
+        self.name = name
+        self.template = template
+        self.fields = []
+        parts = []
+        for literal, field, spec, conversion in string.Formatter().parse(template):
+            parts.append(literal.replace("{", "{{").replace("}", "}}"))
+            if field is None:
+                continue
+            if field not in self.fields:
+                self.fields.append(field)
+            parts.append("{%d}" % self.fields.index(field))
+        self.fields = tuple(self.fields)
+        self._format = "".join(parts)
+
+    @property
+    def usage(self):
+        return " ".join([self.name] + [f"<{field}>" for field in self.fields])
+
+    def format(self, args):
+        if len(args) < len(self.fields):
+            raise CommandUsageError(f"Usage: {self.usage}")
+        return self._format.format(*args)
+
+    def format_named(self, values):
+        return self.format([values.get(field, "") for field in self.fields])
+
+
+class CommandIndex:
+    """Flat lookup table built once from commands.json.
+
+    Bare names resolve to the first category that defines them (the order
+    of commands.json), "<category> <name>" picks a category explicitly.
+    Categories in exclude are only reachable through get(), so resolve()
+    and dispatch() never return them.
+    """
+
+    def __init__(self, commands_db, exclude=()):
+        self.by_name = {}
+        self.by_category = {}
+        for category, cmds in commands_db.items():
+            compiled = {name: CompiledCommand(category, name, template) for name, template in cmds.items()}
+            self.by_category[category] = compiled
+            if category in exclude:
+                continue
+            for name, cmd in compiled.items():
+                self.by_name.setdefault(name, cmd)
+        self.aliases = {category: category for category in self.by_category if category not in exclude}
+        for alias, category in CATEGORY_ALIASES.items():
+            if category in self.aliases:
+                self.aliases.setdefault(alias, category)
+
+    def get(self, category, name):
+        return self.by_category.get(category, {}).get(name)
+
+    def resolve(self, words):
+        """Return (CompiledCommand, args) for a split command line, or None"""
+        if not words:
+            return None
+        if len(words) > 1:
+            category = self.aliases.get(words[0])
+            if category is not None:
+                cmd = self.by_category[category].get(words[1])
+                if cmd is not None:
+                    return cmd, words[2:]
+        cmd = self.by_name.get(words[0])
+        if cmd is None:
+            return None
+        return cmd, words[1:]
+
+    def dispatch(self, text):
+        """Format the server command for a chat command line (prefix stripped)"""
+        match = self.resolve(text.split())
+        if match is None:
+            return None
+        cmd, args = match
+        return cmd.format(args)
@@ -0,0 +1,94 @@
+import json
+import threading
+from collections import deque
+
+# Events that only say "something changed", consecutive ones are merged
+COALESCED_EVENTS = ("data",)
+
+
+def format_sse(entries):
+    """Render (id, event, data) entries in text/event-stream format"""
+    lines = []
+    for event_id, event, data in entries:
+        if event_id is not None:
+            lines.append(f"id: {event_id}\n")
+        lines.append(f"event: {event}\ndata: {json.dumps(data)}\n\n")
+    return "".join(lines)
+
+
+class Subscription:
+    """One connected client with its own bounded buffer"""
+
+    def __init__(self, max_buffer):
+        self.buffer = deque()
+        self.max_buffer = max_buffer
+        self.overflowed = False
+        self.on_push = None
+        self._cond = threading.Condition()
+
+    def push(self, entry):
+        with self._cond:
+            if entry[1] in COALESCED_EVENTS and self.buffer and self.buffer[-1][1] == entry[1]:
+                self.buffer[-1] = entry
+            elif len(self.buffer) >= self.max_buffer:
+                # Slow client, drop what it has and make it resync
+                self.buffer.clear()
+                self.overflowed = True
+            else:
+                self.buffer.append(entry)
+            self._cond.notify()
+        if self.on_push is not None:
+            self.on_push()
+
+    def get(self, timeout=15):
+        """Wait for events and return them all, an empty list means timeout"""
+        with self._cond:
+            if not self.buffer and not self.overflowed:
+                self._cond.wait(timeout)
+            entries = list(self.buffer)
+            self.buffer.clear()
+            if self.overflowed:
+                self.overflowed = False
+                entries.append((None, "reset", {}))
+            return entries
+
+
+class EventBroker:
+    """Fan-out of panel events with a shared backlog for Last-Event-ID resume"""
+
+    def __init__(self, backlog=1000, client_buffer=200):
+        self.client_buffer = client_buffer
+        self._backlog = deque(maxlen=backlog)
+        self._clients = set()
+        self._lock = threading.Lock()
+        self.last_id = 0
+
+    def publish(self, event, data):
+        with self._lock:
+            self.last_id += 1
+            entry = (self.last_id, event, data)
+            self._backlog.append(entry)
+            clients = list(self._clients)
+        for client in clients:
+            client.push(entry)
+
+    def subscribe(self, last_event_id=None):
+        sub = Subscription(self.client_buffer)
+        with self._lock:
+            if last_event_id is not None and last_event_id < self.last_id:
+                if self._backlog and self._backlog[0][0] > last_event_id + 1:
+                    # Missed more than the backlog holds
+                    sub.overflowed = True
+                else:
+                    for entry in self._backlog:
+                        if entry[0] > last_event_id:
+                            sub.push(entry)
+            self._clients.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._clients.discard(sub)
+
+    def client_count(self):
+        return len(self._clients)
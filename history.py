@@ -0,0 +1,236 @@
+import bisect
+import heapq
+import math
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+
+from storage import atomic_write
+
+MAGIC = b"THST"
+FORMAT_VERSION = 1
+NAN = float('nan')
+
+# name, bucket seconds (0 = every sample), seconds kept before moving to the next tier (0 = forever)
+DEFAULT_TIERS = (("raw", 0, 86400), ("hourly", 3600, 30 * 86400), ("daily", 86400, 0))
+
+
+class Tier:
+    """Samples at shared timestamps, one float32 column per (metric, entity).
+
+    Every column has one slot per timestamp, entities missing from a
+    sample hold NaN.
+    """
+
+    def __init__(self, name, bucket, keep):
+        self.name = name
+        self.bucket = bucket
+        self.keep = keep
+        self.times = array('d')
+        self.series = {}
+
+    def append(self, ts, values):
+        slot = len(self.times)
+        self.times.append(ts)
+        for metric, entities in values.items():
+            columns = self.series.setdefault(metric, {})
+            for entity, value in entities.items():
+                column = columns.get(entity)
+                if column is None:
+                    column = columns[entity] = array('f', [NAN]) * slot
+                    column.append(value)
+                elif len(column) == slot:
+                    column.append(value)
+        # Pad entities that were not in this sample
+        for columns in self.series.values():
+            for column in columns.values():
+                if len(column) == slot:
+                    column.append(NAN)
+
+    def drop_before(self, count):
+        """Remove the oldest count samples, and entities with nothing left"""
+        del self.times[:count]
+        for columns in self.series.values():
+            for entity in list(columns):
+                column = columns[entity]
+                del column[:count]
+                if all(math.isnan(value) for value in column):
+                    del columns[entity]
+
+    def slot_at(self, ts):
+        """Index of the last sample at or before ts, -1 if none"""
+        return bisect.bisect_right(self.times, ts) - 1
+
+
+class History:
+    """Columnar time series of town, nation and player stats with downsampling.
+
+    Samples land in the first tier; once older than a tier's keep window
+    they are averaged into buckets of the next tier. With the default tiers
+    that is raw for a day, hourly for 30 days and daily after that.
+    Tiers are saved as binary files in directory.
+    """
+
+    def __init__(self, directory='history', tiers=DEFAULT_TIERS):
+        self.directory = directory
+        self.tiers = [Tier(*tier) for tier in tiers]
+        self.dirty = False
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        for tier in self.tiers:
+            path = self._path(tier)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    self._read_tier(tier, f.read())
+
+    def _path(self, tier):
+        return os.path.join(self.directory, f"{tier.name}.bin")
+
+    # Writing
+
+    def record(self, values, ts=None):
+        """Add one sample, values is {metric: {entity: number}}"""
+        ts = ts or time.time()
+        with self._lock:
+            self.tiers[0].append(ts, values)
+            self._downsample(ts)
+            self.dirty = True
+
+    def _downsample(self, now):
+        for tier, coarser in zip(self.tiers, self.tiers[1:]):
+            if not tier.keep or not tier.times or tier.times[0] >= now - tier.keep:
+                continue
+            # Move whole buckets only, so a bucket is never averaged twice
+            cutoff = (now - tier.keep) // coarser.bucket * coarser.bucket
+            count = bisect.bisect_left(tier.times, cutoff)
+            if not count:
+                continue
+            start = 0
+            while start < count:
+                bucket = tier.times[start] // coarser.bucket * coarser.bucket
+                end = bisect.bisect_left(tier.times, bucket + coarser.bucket, start, count)
+                values = {}
+                for metric, columns in tier.series.items():
+                    averaged = {}
+                    for entity, column in columns.items():
+                        present = [value for value in column[start:end] if not math.isnan(value)]
+                        if present:
+                            averaged[entity] = sum(present) / len(present)
+                    values[metric] = averaged
+                coarser.append(bucket, values)
+                start = end
+            tier.drop_before(count)
+
+    # Queries
+
+    def range(self, metric, entity, start=None, end=None):
+        """[(ts, value)] for one entity, oldest first, coarsest tiers first"""
+        points = []
+        with self._lock:
+            for tier in reversed(self.tiers):
+                column = tier.series.get(metric, {}).get(entity)
+                if column is None:
+                    continue
+                first = 0 if start is None else bisect.bisect_left(tier.times, start)
+                last = len(tier.times) if end is None else bisect.bisect_right(tier.times, end)
+                points.extend(
+                    (tier.times[i], column[i]) for i in range(first, last) if not math.isnan(column[i])
+                )
+        return points
+
+    def _column_at(self, metric, ts):
+        """{entity: value} from the finest tier with a sample at or before ts"""
+        for tier in self.tiers:
+            slot = tier.slot_at(ts)
+            if slot < 0:
+                continue
+            return {
+                entity: column[slot]
+                for entity, column in tier.series.get(metric, {}).items() if not math.isnan(column[slot])
+            }
+        return {}
+
+    def top(self, metric, n=10, at=None, since=None):
+        """Top n entities by value at time at, or by change between since and at"""
+        at = at or time.time()
+        with self._lock:
+            current = self._column_at(metric, at)
+            if since is not None:
+                before = self._column_at(metric, since)
+                current = {entity: value - before.get(entity, 0) for entity, value in current.items()}
+        return heapq.nlargest(n, current.items(), key=lambda item: item[1])
+
+    def metrics(self):
+        with self._lock:
+            return sorted({metric for tier in self.tiers for metric in tier.series})
+
+    # Persistence
+
+    def _tier_bytes(self, tier):
+        parts = [MAGIC, struct.pack('<HI', FORMAT_VERSION, len(tier.times))]
+        times = tier.times
+        if sys.byteorder != 'little':
+            times = array('d', times)
+            times.byteswap()
+        parts.append(times.tobytes())
+        parts.append(struct.pack('<I', len(tier.series)))
+        for metric, columns in tier.series.items():
+            encoded = metric.encode('utf-8')
+            parts.append(struct.pack('<HI', len(encoded), len(columns)))
+            parts.append(encoded)
+            for entity, column in columns.items():
+                encoded = entity.encode('utf-8')
+                parts.append(struct.pack('<H', len(encoded)))
+                parts.append(encoded)
+                if sys.byteorder != 'little':
+                    column = array('f', column)
+                    column.byteswap()
+                parts.append(column.tobytes())
+        return b"".join(parts)
+
+    def _read_tier(self, tier, data):
+        if data[:4] != MAGIC:
+            raise ValueError(f"Not a history file: {self._path(tier)}")
+        version, count = struct.unpack_from('<HI', data, 4)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported history version {version}")
+        pos = 10
+        tier.times = array('d')
+        tier.times.frombytes(data[pos:pos + 8 * count])
+        pos += 8 * count
+        (metric_count,) = struct.unpack_from('<I', data, pos)
+        pos += 4
+        for _ in range(metric_count):
+            length, entity_count = struct.unpack_from('<HI', data, pos)
+            pos += 6
+            columns = tier.series[data[pos:pos + length].decode('utf-8')] = {}
+            pos += length
+            for _ in range(entity_count):
+                (length,) = struct.unpack_from('<H', data, pos)
+                pos += 2
+                entity = data[pos:pos + length].decode('utf-8')
+                pos += length
+                column = columns[entity] = array('f')
+                column.frombytes(data[pos:pos + 4 * count])
+                pos += 4 * count
+                if sys.byteorder != 'little':
+                    column.byteswap()
+        if sys.byteorder != 'little':
+            tier.times.byteswap()
+
+    def save(self):
+        if not self.dirty:
+            return False
+        with self._lock:
+            self.dirty = False
+            files = [(self._path(tier), self._tier_bytes(tier)) for tier in self.tiers]
+        try:
+            for path, data in files:
+                atomic_write(path, data)
+        except Exception:
+            self.dirty = True
+            raise
+        return True
@@ -0,0 +1,241 @@
+import bisect
+import threading
+from collections.abc import Mapping
+
+
+class NameIndex:
+    """Case-insensitive name lookup with sorted prefix search"""
+
+    def __init__(self):
+        self.names = {}
+        self.sorted = []
+
+    def add(self, name):
+        lower = name.lower()
+        if lower not in self.names:
+            bisect.insort(self.sorted, lower)
+        self.names[lower] = name
+
+    def remove(self, name):
+        lower = name.lower()
+        if self.names.pop(lower, None) is not None:
+            i = bisect.bisect_left(self.sorted, lower)
+            if i < len(self.sorted) and self.sorted[i] == lower:
+                del self.sorted[i]
+
+    def lookup(self, name):
+        return self.names.get(name.lower())
+
+    def page(self, after=None, prefix="", limit=50):
+        """Names sorted case-insensitively, starting after the cursor and matching prefix"""
+        prefix = prefix.lower()
+        if after and after.lower() >= prefix:
+            i = bisect.bisect_right(self.sorted, after.lower())
+        else:
+            i = bisect.bisect_left(self.sorted, prefix)
+        results = []
+        while i < len(self.sorted) and len(results) < limit and self.sorted[i].startswith(prefix):
+            results.append(self.names[self.sorted[i]])
+            i += 1
+        more = i < len(self.sorted) and self.sorted[i].startswith(prefix)
+        return results, (results[-1] if more and results else None)
+
+    def prefix(self, prefix, limit=10):
+        prefix = prefix.lower()
+        i = bisect.bisect_left(self.sorted, prefix)
+        results = []
+        while i < len(self.sorted) and len(results) < limit and self.sorted[i].startswith(prefix):
+            results.append(self.names[self.sorted[i]])
+            i += 1
+        return results
+
+    def __len__(self):
+        return len(self.sorted)
+
+
+class TownyIndex:
+    """Secondary indexes over a TownyStore, kept current through store.subscribe().
+
+    Built lazily on the first query so startup doesn't have to load every
+    section.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.RLock()
+        self._built = False
+        store.subscribe(self._on_change)
+
+    def _reset(self):
+        self.towns = NameIndex()
+        self.nations = NameIndex()
+        self.sieges = {}
+        self.siege_names = NameIndex()
+        self.town_nation = {}
+        self.nation_towns = {}
+        self.player_town = {}
+        self.town_residents = {}
+        self.balances = []
+        self._town_state = {}
+        self._player_state = {}
+        self._siege_state = {}
+
+    def build(self):
+        """Load the sections and build the index now instead of on the first query"""
+        self._ensure()
+
+    def _ensure(self):
+        if self._built:
+            return
+        sections = {section: self.store.load(section) for section in ("towns", "nations", "players", "sieges")}
+        # Store lock first, the same order writers take them in
+        with self.store.lock, self._lock:
+            if self._built:
+                return
+            self._reset()
+            for name, town in sections["towns"].items():
+                self._add_town(name, town)
+            for name in sections["nations"]:
+                self.nations.add(name)
+            for name, player in sections["players"].items():
+                self._add_player(name, player)
+            for key, siege in sections["sieges"].items():
+                self._add_siege(key, siege)
+            self._built = True
+
+    def _on_change(self, section, key, value):
+        if not self._built:
+            return
+        with self._lock:
+            if section == "towns":
+                self._remove_town(key)
+                if value is not None:
+                    self._add_town(key, value)
+            elif section == "nations":
+                self.nations.remove(key)
+                if value is not None:
+                    self.nations.add(key)
+            elif section == "players":
+                self._remove_player(key)
+                if value is not None:
+                    self._add_player(key, value)
+            elif section == "sieges":
+                self._remove_siege(key)
+                if value is not None:
+                    self._add_siege(key, value)
+
+    # Towns
+
+    def _add_town(self, name, town):
+        nation = town.get("nation")
+        balance = town.get("balance") or 0
+        residents = tuple(town.get("residents", ()))
+        self.towns.add(name)
+        if nation:
+            self.town_nation[name] = nation
+            self.nation_towns.setdefault(nation.lower(), set()).add(name)
+        for player in residents:
+            self.town_residents.setdefault(player.lower(), name)
+        bisect.insort(self.balances, (-balance, name.lower()))
+        self._town_state[name] = (nation, balance, residents)
+
+    def _remove_town(self, name):
+        state = self._town_state.pop(name, None)
+        if state is None:
+            return
+        nation, balance, residents = state
+        self.towns.remove(name)
+        self.town_nation.pop(name, None)
+        if nation:
+            towns = self.nation_towns.get(nation.lower())
+            if towns:
+                towns.discard(name)
+        for player in residents:
+            if self.town_residents.get(player.lower()) == name:
+                del self.town_residents[player.lower()]
+        entry = (-balance, name.lower())
+        i = bisect.bisect_left(self.balances, entry)
+        if i < len(self.balances) and self.balances[i] == entry:
+            del self.balances[i]
+
+    # Players
+
+    def _add_player(self, name, player):
+        town = player.get("town") if isinstance(player, Mapping) else None
+        if town:
+            self.player_town[name.lower()] = town
+        self._player_state[name] = town
+
+    def _remove_player(self, name):
+        if self._player_state.pop(name, None):
+            self.player_town.pop(name.lower(), None)
+
+    # Sieges
+
+    def _add_siege(self, key, siege):
+        defender = siege.get("defender") or key
+        self.sieges[key.lower()] = key
+        self.siege_names.add(key)
+        self.sieges.setdefault(defender.lower(), key)
+        self._siege_state[key] = defender
+
+    def _remove_siege(self, key):
+        defender = self._siege_state.pop(key, None)
+        if defender is None:
+            return
+        self.sieges.pop(key.lower(), None)
+        self.siege_names.remove(key)
+        if self.sieges.get(defender.lower()) == key:
+            del self.sieges[defender.lower()]
+
+    # Queries
+
+    def find_town(self, name):
+        self._ensure()
+        key = self.towns.lookup(name)
+        return self.store.get_entity("towns", key) if key else None
+
+    def find_nation(self, name):
+        self._ensure()
+        key = self.nations.lookup(name)
+        return self.store.get_entity("nations", key) if key else None
+
+    def find_siege(self, town_name):
+        self._ensure()
+        key = self.sieges.get(town_name.lower())
+        return self.store.get_entity("sieges", key) if key else None
+
+    def search_towns(self, prefix, limit=10):
+        self._ensure()
+        return self.towns.prefix(prefix, limit)
+
+    def search_nations(self, prefix, limit=10):
+        self._ensure()
+        return self.nations.prefix(prefix, limit)
+
+    def page(self, section, after=None, prefix="", limit=50):
+        """Cursor-paginated (names, next_cursor) for towns, nations or sieges"""
+        self._ensure()
+        names = {"towns": self.towns, "nations": self.nations, "sieges": self.siege_names}[section]
+        with self._lock:
+            return names.page(after, prefix, limit)
+
+    def nation_of(self, town_name):
+        self._ensure()
+        key = self.towns.lookup(town_name)
+        return self.town_nation.get(key) if key else None
+
+    def towns_of(self, nation_name):
+        self._ensure()
+        return sorted(self.nation_towns.get(nation_name.lower(), ()))
+
+    def town_of(self, player_name):
+        self._ensure()
+        lower = player_name.lower()
+        return self.player_town.get(lower) or self.town_residents.get(lower)
+
+    def top_towns(self, n=10):
+        self._ensure()
+        with self._lock:
+            top = self.balances[:n]
+        return [self.towns.names[lower] for _, lower in top]
@@ -0,0 +1,348 @@
+import queue
+import re
+import threading
+import time
+from collections import deque
+
+# Commands whose replies we parse, matched against what the chat queue sends.
+# Status commands name the town/nation/siege the screen will be about, a
+# bare /town or /nation is the bot's own.
+COMMAND_REPLIES = [
+    (re.compile(r"^/town list\b"), "town_list"),
+    (re.compile(r"^/nation list\b"), "nation_list"),
+    (re.compile(r"^/siege list\b"), "siege_list"),
+    (re.compile(r"^/siege info (?P<name>\S+)$"), "siege_status"),
+    (re.compile(r"^/town(?: (?P<name>\S+))?$"), "town_status"),
+    (re.compile(r"^/nation(?: (?P<name>\S+))?$"), "nation_status"),
+]
+# Towny subcommands, "/town claim" is not the status of a town named claim
+STATUS_SUBCOMMANDS = {
+    "town_status": frozenset((
+        "add", "balance", "bankhistory", "buy", "claim", "create", "delete", "deposit", "here", "invite",
+        "join", "kick", "leave", "list", "new", "online", "outlaw", "plots", "rank", "ranks", "reslist",
+        "say", "set", "setspawn", "spawn", "toggle", "top", "unclaim", "withdraw",
+    )),
+    "nation_status": frozenset((
+        "add", "ally", "balance", "bankhistory", "create", "delete", "deposit", "enemy", "invite", "join",
+        "kick", "king", "leave", "list", "merge", "new", "online", "rank", "ranks", "say", "set", "spawn",
+        "toggle", "withdraw",
+    )),
+}
+
+# .oOo.__________[ Name (Nation) ]__________.oOo.
+STATUS_HEADER = re.compile(r"^\.oOo\.[_.\s]*\[ (?P<name>[^\]()]+?)(?: \((?P<parent>[^)]+)\))? \][_.\s]*\.oOo\.$")
+LIST_HEADER = re.compile(r"^\.oOo\.[_.\s]*\[ (?P<kind>Town|Nation|Siege) List \][_.\s]*\.oOo\.$", re.IGNORECASE)
+PAGE_FOOTER = re.compile(r"^Page \d+ of \d+$", re.IGNORECASE)
+
+FIELD = re.compile(r"^(?P<field>[A-Za-z ]+?)(?: \[(?P<count>\d+)\])?: (?P<value>.*)$")
+# Name (12), Other (3)
+LIST_ENTRY = re.compile(r"(?P<name>[A-Za-z0-9_\-]+) \((?P<count>\d+)\)")
+# Attacker vs Defender - Status
+SIEGE_ENTRY = re.compile(r"^(?P<attacker>[A-Za-z0-9_\-]+) vs (?P<defender>[A-Za-z0-9_\-]+)(?: - (?P<status>.+))?$")
+MONEY = re.compile(r"-?[\d,]+(?:\.\d+)?")
+
+LIST_KINDS = {"town": "town_list", "nation": "nation_list", "siege": "siege_list"}
+
+
+def parse_money(value):
+    match = MONEY.search(value)
+    return float(match.group().replace(",", "")) if match else 0.0
+
+
+def parse_names(value):
+    return [name.strip() for name in value.split(",") if name.strip() and name.strip() != "None"]
+
+
+class Reply:
+    """Lines of one multi-line reply being collected"""
+
+    __slots__ = ("kind", "name", "parent", "lines", "updated")
+
+    def __init__(self, kind, name=None, parent=None):
+        self.kind = kind
+        self.name = name
+        self.parent = parent
+        self.lines = []
+        self.updated = time.monotonic()
+
+
+class ChatIngestor:
+    """Turns Towny plugin replies in server chat into towny_data updates.
+
+    feed() only queues the line, so the mineflayer event thread never waits.
+    A worker thread drains the queue in batches, matches lines against
+    precompiled patterns and pairs each reply with the command that asked
+    for it (command_sent() is called by the chat queue). Updates from a
+    whole batch are merged and applied with one update_many() per section.
+
+    A reply ends at the next header, a page footer, or after reply_timeout
+    seconds without a line that belongs to it, since player chat can be
+    interleaved with it.
+
+    If on_balances is set, town and nation balances are not written to the
+    store but passed to on_balances(section, {name: balance}) after the
+    batch, so a ledger can book the difference and update the store.
+    """
+
+    def __init__(self, store, reply_timeout=1.0, command_timeout=10.0, batch_size=500, on_balances=None):
+        self.store = store
+        self.on_balances = on_balances
+        self.reply_timeout = reply_timeout
+        self.command_timeout = command_timeout
+        self.batch_size = batch_size
+        self._lines = queue.SimpleQueue()
+        self._expected = deque()
+        self._expected_lock = threading.Lock()
+        self._reply = None
+        self._changes = {}
+        self._thread = None
+        self._running = False
+        self.stats = {"lines": 0, "matched": 0, "replies": 0, "updates": 0, "batches": 0, "max_lag": 0.0}
+
+    # Producer side (any thread)
+
+    def feed(self, line):
+        self._lines.put((time.monotonic(), line))
+
+    def command_sent(self, message):
+        for pattern, kind in COMMAND_REPLIES:
+            match = pattern.match(message)
+            if match:
+                name = match.groupdict().get("name")
+                if name is not None:
+                    name = name.lower()
+                    if name in STATUS_SUBCOMMANDS.get(kind, ()):
+                        return
+                with self._expected_lock:
+                    self._expected.append((time.monotonic(), kind, name))
+                return
+
+    def depth(self):
+        return self._lines.qsize()
+
+    # Pairing replies with commands
+
+    def _claim_expected(self, kinds, name=None):
+        """Pop the oldest outstanding command whose reply is one of kinds, and about name if it named one"""
+        now = time.monotonic()
+        name = name.lower() if name else None
+        with self._expected_lock:
+            while self._expected and now - self._expected[0][0] > self.command_timeout:
+                self._expected.popleft()
+            for i, (sent, kind, expected_name) in enumerate(self._expected):
+                if kind in kinds and (expected_name is None or expected_name == name):
+                    del self._expected[i]
+                    return kind
+        return None
+
+    # Parsing (worker thread)
+
+    def parse_line(self, line):
+        line = line.strip()
+        header = LIST_HEADER.match(line)
+        if header:
+            kind = LIST_KINDS[header.group("kind").lower()]
+            self._claim_expected((kind,))
+            self._start(Reply(kind))
+            return True
+        header = STATUS_HEADER.match(line)
+        if header:
+            # Town and nation screens look alike, the command tells them apart
+            kind = self._claim_expected(("town_status", "nation_status", "siege_status"), header.group("name").strip())
+            if kind is None:
+                self._finish()
+                return False
+            self._start(Reply(kind, header.group("name").strip(), header.group("parent")))
+            return True
+
+        reply = self._reply
+        if reply is None:
+            return False
+        if PAGE_FOOTER.match(line):
+            self._finish()
+            return True
+        if reply.kind == "siege_list":
+            matched = SIEGE_ENTRY.match(line)
+        elif reply.kind in ("town_list", "nation_list"):
+            matched = LIST_ENTRY.search(line)
+        else:
+            matched = FIELD.match(line)
+        if not matched:
+            return False
+        reply.lines.append(line)
+        reply.updated = time.monotonic()
+        return True
+
+    def _start(self, reply):
+        self._finish()
+        self._reply = reply
+
+    def _finish(self):
+        reply, self._reply = self._reply, None
+        if reply is None:
+            return
+        self.stats["replies"] += 1
+        getattr(self, f"_apply_{reply.kind}")(reply)
+
+    def _change(self, section, key, fields):
+        self._changes.setdefault(section, {}).setdefault(key, {}).update(fields)
+
+    def _apply_town_list(self, reply):
+        for line in reply.lines:
+            for entry in LIST_ENTRY.finditer(line):
+                name = entry.group("name")
+                self._change("towns", name, {"name": name, "residents_count": int(entry.group("count"))})
+
+    def _apply_nation_list(self, reply):
+        for line in reply.lines:
+            for entry in LIST_ENTRY.finditer(line):
+                name = entry.group("name")
+                self._change("nations", name, {"name": name, "towns_count": int(entry.group("count"))})
+
+    def _apply_siege_list(self, reply):
+        for line in reply.lines:
+            entry = SIEGE_ENTRY.match(line)
+            defender = entry.group("defender")
+            self._change("sieges", defender, {
+                "attacker": entry.group("attacker"),
+                "defender": defender,
+                "status": entry.group("status") or "active"
+            })
+
+    def _fields(self, reply):
+        fields = {}
+        for line in reply.lines:
+            match = FIELD.match(line)
+            fields[match.group("field").strip().lower()] = (match.group("value").strip(), match.group("count"))
+        return fields
+
+    def _apply_town_status(self, reply):
+        fields = self._fields(reply)
+        town = {"name": reply.name, "nation": reply.parent}
+        if "mayor" in fields:
+            town["mayor"] = fields["mayor"][0]
+        if "bank" in fields:
+            town["balance"] = parse_money(fields["bank"][0])
+        if "town size" in fields:
+            town["claims"] = int(parse_money(fields["town size"][0].split("/")[0]))
+        if "founded" in fields:
+            town["founded_date"] = fields["founded"][0]
+        if "residents" in fields:
+            value, count = fields["residents"]
+            residents = parse_names(value)
+            town["residents"] = residents
+            town["residents_count"] = int(count) if count else len(residents)
+            for resident in residents:
+                self._change("players", resident, {"town": reply.name})
+        self._change("towns", reply.name, town)
+
+    def _apply_nation_status(self, reply):
+        fields = self._fields(reply)
+        nation = {"name": reply.name}
+        if "king" in fields:
+            nation["king"] = fields["king"][0]
+        if "capital" in fields:
+            nation["capital"] = fields["capital"][0]
+        if "bank" in fields:
+            nation["balance"] = parse_money(fields["bank"][0])
+        if "towns" in fields:
+            value, count = fields["towns"]
+            towns = parse_names(value)
+            nation["towns_count"] = int(count) if count else len(towns)
+            for town in towns:
+                self._change("towns", town, {"name": town, "nation": reply.name})
+        for key in ("allies", "enemies"):
+            if key in fields:
+                nation[key] = parse_names(fields[key][0])
+        self._change("nations", reply.name, nation)
+
+    def _apply_siege_status(self, reply):
+        fields = self._fields(reply)
+        siege = {"defender": reply.name}
+        for field, key in (("attacker", "attacker"), ("status", "status"), ("banner control", "banner_control")):
+            if field in fields:
+                siege[key] = fields[field][0]
+        if "war chest" in fields:
+            siege["war_chest"] = parse_money(fields["war chest"][0])
+        self._change("sieges", reply.name, siege)
+
+    def _siege_changes(self, sieges):
+        """Leave ended sieges alone unless the server reports a new attacker on the town.
+
+        A new attacker starts a new siege, so the old one's schedule, escrow
+        and result are cleared. The same attacker still in /siege list is
+        the siege that already ended here.
+        """
+        changes = {}
+        for key, fields in sieges.items():
+            current = self.store.get_entity("sieges", key)
+            if current is not None and current.get("ended_at"):
+                attacker = fields.get("attacker")
+                if not attacker or attacker == current.get("attacker"):
+                    continue
+                fields = dict(
+                    fields, started_at=None, ends_at=None, ended_at=None, winner=None,
+                    status=fields.get("status") or "active", war_chest=fields.get("war_chest", 0),
+                    banner_control=fields.get("banner_control")
+                )
+            changes[key] = fields
+        return changes
+
+    def flush(self):
+        """Close a stale reply and write everything parsed so far, returns the number of entities updated"""
+        if self._reply is not None and time.monotonic() - self._reply.updated > self.reply_timeout:
+            self._finish()
+        changes, self._changes = self._changes, {}
+        if "sieges" in changes:
+            changes["sieges"] = self._siege_changes(changes["sieges"])
+        updated = 0
+        balances = {}
+        for section, entities in changes.items():
+            if self.on_balances is not None:
+                for key, fields in entities.items():
+                    if "balance" in fields:
+                        balances.setdefault(section, {})[key] = fields.pop("balance")
+            self.store.update_many(section, entities)
+            updated += len(entities)
+        for section, section_balances in balances.items():
+            self.on_balances(section, section_balances)
+        self.stats["updates"] += updated
+        return updated
+
+    # Worker
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._running = False
+
+    def _run(self):
+        while self._running:
+            try:
+                batch = [self._lines.get(timeout=self.reply_timeout / 2)]
+            except queue.Empty:
+                batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._lines.get_nowait())
+                except queue.Empty:
+                    break
+            if batch:
+                self.stats["max_lag"] = max(self.stats["max_lag"], time.monotonic() - batch[0][0])
+                self.stats["batches"] += 1
+            for queued_at, line in batch:
+                self.stats["lines"] += 1
+                try:
+                    if self.parse_line(line):
+                        self.stats["matched"] += 1
+                except Exception as e:
+                    print(f"⚠️ Could not parse '{line}': {e}")
+                    self._reply = None
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Chat ingestion failed: {e}")
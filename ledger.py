@@ -0,0 +1,226 @@
+import json
+import sqlite3
+import threading
+import time
+
+# Money entering or leaving the economy (admin grants, server-side taxes) moves through this account
+SERVER_ACCOUNT = "server"
+
+
+class Ledger:
+    """Append-only double-entry ledger of balance transfers.
+
+    Every transaction moves an amount from a debit account to a credit
+    account and both legs are stored with the balance they leave behind,
+    so "balance at time T" is a single indexed lookup. Running balances
+    are kept in memory.
+
+    Transactions are queued and group-committed by flush(), which runs
+    once batch_size transactions are waiting or from the scheduler.
+    Every snapshot_every transactions the balances are snapshotted, so
+    startup only replays what came after the last snapshot.
+    """
+
+    def __init__(self, path='ledger.db', batch_size=256, snapshot_every=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.snapshot_every = snapshot_every
+        self.balances = {}
+        self.last_id = 0
+        self.last_ts = 0
+        self._pending = []
+        self._snapshot_id = 0
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS transactions ("
+            "id INTEGER PRIMARY KEY, ts REAL NOT NULL, debit TEXT NOT NULL, credit TEXT NOT NULL, "
+            "amount REAL NOT NULL, kind TEXT, memo TEXT)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            "tx_id INTEGER NOT NULL, account TEXT NOT NULL, ts REAL NOT NULL, "
+            "amount REAL NOT NULL, balance REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS postings_account ON postings (account, ts, tx_id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots (tx_id INTEGER PRIMARY KEY, ts REAL, balances TEXT)"
+        )
+        self._load()
+
+    def _load(self):
+        row = self._conn.execute(
+            "SELECT tx_id, balances FROM snapshots ORDER BY tx_id DESC LIMIT 1"
+        ).fetchone()
+        if row:
+            self._snapshot_id = row[0]
+            self.balances = json.loads(row[1])
+        # Each posting carries the balance after it, so replay is just the last value per account
+        for account, balance in self._conn.execute(
+            "SELECT account, balance FROM postings WHERE tx_id > ? ORDER BY tx_id", (self._snapshot_id,)
+        ):
+            self.balances[account] = balance
+        self.last_id, self.last_ts = self._conn.execute(
+            "SELECT COALESCE(MAX(id), 0), COALESCE(MAX(ts), 0) FROM transactions"
+        ).fetchone()
+
+    # Recording
+
+    @staticmethod
+    def _check(debit, credit, amount):
+        if debit == credit:
+            raise ValueError("Cannot transfer to the same account")
+        amount = float(amount)
+        if not amount > 0:
+            raise ValueError("Amount must be positive")
+        return amount
+
+    def _add(self, debit, credit, amount, kind, memo, ts):
+        """Queue one checked transfer, caller holds _lock"""
+        # Timestamps never go backwards, so per-account history stays ordered
+        ts = max(ts or time.time(), self.last_ts)
+        self.last_id += 1
+        self.last_ts = ts
+        debit_balance = self.balances.get(debit, 0) - amount
+        credit_balance = self.balances.get(credit, 0) + amount
+        self.balances[debit] = debit_balance
+        self.balances[credit] = credit_balance
+        tx = {
+            "id": self.last_id, "ts": ts, "debit": debit, "credit": credit,
+            "amount": amount, "kind": kind, "memo": memo
+        }
+        self._pending.append((tx, debit_balance, credit_balance))
+        return tx
+
+    def transfer(self, debit, credit, amount, kind="transfer", memo=None, ts=None):
+        """Move amount from debit to credit, returns the transaction"""
+        amount = self._check(debit, credit, amount)
+        with self._lock:
+            tx = self._add(debit, credit, amount, kind, memo, ts)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+        return tx
+
+    def transfer_many(self, transfers):
+        """Record (debit, credit, amount, kind, memo) transfers and commit them in one transaction.
+
+        Every transfer is checked before any is recorded, so a bad one leaves
+        the ledger untouched.
+        """
+        checked = [
+            (debit, credit, self._check(debit, credit, amount), kind, memo)
+            for debit, credit, amount, kind, memo in transfers
+        ]
+        with self._lock:
+            txs = [self._add(debit, credit, amount, kind, memo, None) for debit, credit, amount, kind, memo in checked]
+        self.flush()
+        return txs
+
+    def set_balance(self, account, balance, kind="set", memo=None):
+        """Record the transfer that brings account to balance, None if it already is"""
+        difference = float(balance) - self.balance(account)
+        if difference > 0:
+            return self.transfer(SERVER_ACCOUNT, account, difference, kind, memo)
+        if difference < 0:
+            return self.transfer(account, SERVER_ACCOUNT, -difference, kind, memo)
+        return None
+
+    def open(self, account, balance):
+        """Give an account the opening balance it had before the ledger knew about it"""
+        if account in self.balances or not balance:
+            return None
+        return self.set_balance(account, balance, kind="opening")
+
+    def flush(self):
+        """Write queued transactions in one SQLite transaction, returns how many"""
+        with self._db_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                snapshot = None
+                if pending and self.last_id - self._snapshot_id >= self.snapshot_every:
+                    snapshot = (self.last_id, self.last_ts, json.dumps(self.balances))
+            if not pending:
+                return 0
+            transactions, postings = [], []
+            for tx, debit_balance, credit_balance in pending:
+                transactions.append((tx["id"], tx["ts"], tx["debit"], tx["credit"], tx["amount"], tx["kind"], tx["memo"]))
+                postings.append((tx["id"], tx["debit"], tx["ts"], -tx["amount"], debit_balance))
+                postings.append((tx["id"], tx["credit"], tx["ts"], tx["amount"], credit_balance))
+            conn = self._conn
+            try:
+                conn.execute("BEGIN")
+                conn.executemany("INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?)", transactions)
+                conn.executemany("INSERT INTO postings VALUES (?, ?, ?, ?, ?)", postings)
+                if snapshot:
+                    conn.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)", snapshot)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                with self._lock:
+                    self._pending[:0] = pending
+                raise
+            if snapshot:
+                self._snapshot_id = snapshot[0]
+            return len(pending)
+
+    # Queries
+
+    def balance(self, account):
+        return self.balances.get(account, 0)
+
+    def _pending_postings(self, account):
+        """Queued legs touching account, oldest first, as (tx, amount, balance)"""
+        with self._lock:
+            pending = list(self._pending)
+        postings = []
+        for tx, debit_balance, credit_balance in pending:
+            if tx["debit"] == account:
+                postings.append((tx, -tx["amount"], debit_balance))
+            elif tx["credit"] == account:
+                postings.append((tx, tx["amount"], credit_balance))
+        return postings
+
+    def balance_at(self, account, ts):
+        """Balance of account right after the last transaction at or before ts"""
+        for tx, amount, balance in reversed(self._pending_postings(account)):
+            if tx["ts"] <= ts:
+                return balance
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT balance FROM postings WHERE account = ? AND ts <= ? ORDER BY ts DESC, tx_id DESC LIMIT 1",
+                (account, ts)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def history(self, account, before=None, limit=50):
+        """Transactions touching account, newest first, before a transaction id for paging"""
+        entries = []
+        for tx, amount, balance in reversed(self._pending_postings(account)):
+            if before is None or tx["id"] < before:
+                entries.append(dict(tx, change=amount, balance=balance))
+        if len(entries) >= limit:
+            return entries[:limit]
+        if entries:
+            before = entries[-1]["id"]
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT t.id, t.ts, t.debit, t.credit, t.amount, t.kind, t.memo, p.amount, p.balance "
+                "FROM postings p JOIN transactions t ON t.id = p.tx_id "
+                "WHERE p.account = ? AND p.tx_id < ? ORDER BY p.ts DESC, p.tx_id DESC LIMIT ?",
+                (account, before if before is not None else self.last_id + 1, limit - len(entries))
+            ).fetchall()
+        for tx_id, ts, debit, credit, amount, kind, memo, change, balance in rows:
+            entries.append({
+                "id": tx_id, "ts": ts, "debit": debit, "credit": credit, "amount": amount,
+                "kind": kind, "memo": memo, "change": change, "balance": balance
+            })
+        return entries
+
+    def close(self):
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
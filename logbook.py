@@ -0,0 +1,210 @@
+import bisect
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+
+class RingBuffer:
+    """Fixed-capacity buffer of the most recent items, O(1) append"""
+
+    def __init__(self, capacity):
+        self._items = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def append(self, item):
+        with self._lock:
+            self._items.append(item)
+
+    def latest(self, n):
+        with self._lock:
+            if n >= len(self._items):
+                return list(self._items)
+            return [self._items[i] for i in range(len(self._items) - n, len(self._items))]
+
+    def since(self, item_id):
+        """Items with an "id" greater than item_id, oldest first"""
+        with self._lock:
+            newer = []
+            for item in reversed(self._items):
+                if item["id"] <= item_id:
+                    break
+                newer.append(item)
+        newer.reverse()
+        return newer
+
+    def __len__(self):
+        return len(self._items)
+
+
+class LogArchive:
+    """Append-only JSON lines log split into size-rotated files.
+
+    Files are named <name>-<seq>.jsonl; each entry carries a "ts" epoch
+    timestamp, so a time range only has to scan the files that overlap it.
+    max_files=0 keeps every file.
+    """
+
+    def __init__(self, directory, name, max_bytes=4 * 1024 * 1024, max_files=0):
+        self.directory = directory
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self._pattern = re.compile(rf"^{re.escape(name)}-(\d+)\.jsonl$")
+        self._lock = threading.Lock()
+        self._file = None
+        os.makedirs(directory, exist_ok=True)
+        self._seqs = sorted(
+            int(m.group(1)) for m in map(self._pattern.match, os.listdir(directory)) if m
+        )
+        self._first_ts = {}
+
+    def _path(self, seq):
+        return os.path.join(self.directory, f"{self.name}-{seq:06d}.jsonl")
+
+    def _open_current(self):
+        if self._file is None:
+            if not self._seqs:
+                self._seqs.append(1)
+            self._file = open(self._path(self._seqs[-1]), 'a', encoding='utf-8')
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        self._seqs.append(self._seqs[-1] + 1)
+        if self.max_files and len(self._seqs) > self.max_files:
+            for seq in self._seqs[:-self.max_files]:
+                try:
+                    os.remove(self._path(seq))
+                except OSError:
+                    pass
+                self._first_ts.pop(seq, None)
+            del self._seqs[:-self.max_files]
+
+    def append(self, entry):
+        line = json.dumps(entry, separators=(',', ':')) + "\n"
+        with self._lock:
+            self._open_current()
+            if self._file.tell() and self._file.tell() + len(line) > self.max_bytes:
+                self._rotate()
+                self._open_current()
+            if self._file.tell() == 0:
+                self._first_ts[self._seqs[-1]] = entry["ts"]
+            self._file.write(line)
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def last_entry(self):
+        """Newest archived entry, read from the tail of the newest file"""
+        for seq in reversed(self._seqs):
+            path = self._path(seq)
+            if not os.path.exists(path) or not os.path.getsize(path):
+                continue
+            with open(path, 'rb') as f:
+                f.seek(max(0, os.path.getsize(path) - 65536))
+                lines = f.read().splitlines()
+            for line in reversed(lines):
+                try:
+                    return json.loads(line)
+                except ValueError:
+                    continue
+        return None
+
+    def _file_first_ts(self, seq):
+        if seq not in self._first_ts:
+            first = None
+            try:
+                with open(self._path(seq), 'r', encoding='utf-8') as f:
+                    first = json.loads(f.readline())["ts"]
+            except (OSError, ValueError, KeyError):
+                pass
+            # Empty files sort last so they never split a time range
+            self._first_ts[seq] = first if first is not None else float('inf')
+        return self._first_ts[seq]
+
+    def query(self, start=None, end=None, contains=None, offset=0, limit=100):
+        """Entries with start <= ts < end, newest first, optionally filtered by text"""
+        self.flush()
+        with self._lock:
+            seqs = list(self._seqs)
+        starts = [self._file_first_ts(seq) for seq in seqs]
+        last = len(seqs) if end is None else bisect.bisect_left(starts, end)
+        contains = contains.lower() if contains else None
+        results = []
+        for i in range(last - 1, -1, -1):
+            try:
+                with open(self._path(seqs[i]), 'r', encoding='utf-8') as f:
+                    lines = f.readlines()
+            except OSError:
+                continue
+            for line in reversed(lines):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                ts = entry.get("ts", 0)
+                if (end is not None and ts >= end) or (start is not None and ts < start):
+                    continue
+                if contains and contains not in line.lower():
+                    continue
+                if offset:
+                    offset -= 1
+                    continue
+                results.append(entry)
+                if len(results) >= limit:
+                    return results
+            if start is not None and starts[i] < start:
+                break
+        return results
+
+
+class LogBook:
+    """Recent entries in a RingBuffer, everything in a LogArchive"""
+
+    def __init__(self, directory, name, capacity=50, max_bytes=4 * 1024 * 1024, max_files=0, flush_each=False):
+        self.recent = RingBuffer(capacity)
+        self.archive = LogArchive(directory, name, max_bytes, max_files)
+        self.flush_each = flush_each
+        self._lock = threading.Lock()
+        last = self.archive.last_entry()
+        self.last_id = last.get("id", 0) if last else 0
+        if last:
+            for entry in self.archive.query(limit=capacity)[::-1]:
+                self.recent.append(entry)
+
+    def append(self, entry):
+        """Stamp entry with an id and timestamp, keep it in memory and archive it"""
+        with self._lock:
+            self.last_id += 1
+            entry = dict(entry, id=self.last_id, ts=entry.get("ts") or time.time())
+            self.recent.append(entry)
+            self.archive.append(entry)
+        if self.flush_each:
+            self.archive.flush()
+        return entry
+
+    def latest(self, n):
+        return self.recent.latest(n)
+
+    def since(self, entry_id):
+        return self.recent.since(entry_id)
+
+    def query(self, start=None, end=None, contains=None, offset=0, limit=100):
+        return self.archive.query(start, end, contains, offset, limit)
+
+    def flush(self):
+        self.archive.flush()
+
+    def close(self):
+        self.archive.close()
@@ -3,40 +3,387 @@ import asyncio
 import discord
 from mineflayer import Bot
 from discord.ext import commands
-from flask import Flask, request, render_template_string
-import threading
+from flask import Flask, Response, g, jsonify, request
 import time
+import io
 import os
+import signal
+import itertools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from aiohttp import web
+from storage import TownyStore
+from serializer import Serializer
+from servers import ServerPool, ServerState
+from events import EventBroker
+from logbook import LogBook
+from claims import ClaimIndex
+from ledger import Ledger, SERVER_ACCOUNT
+from bulk import AMOUNT_COMMANDS, BulkRun, parse_batch, validate_batch
+from runtime import Supervisor, WSGIHandler, sse_handler
+from scheduler import Scheduler
+from render_cache import RenderCache
+from history import History
+from metrics import Registry, SamplingProfiler
+from dispatch import CommandIndex, CommandUsageError
+from chat_queue import PRIORITY_ADMIN, PRIORITY_COMMAND, PRIORITY_CHAT
 
 # Load configuration
 with open('config.json', 'r') as f:
     config = json.load(f)
 
-with open('commands.json', 'r') as f:
-    commands_db = json.load(f)
-
-# Load or create towny data
-try:
-    with open('towny_data.json', 'r') as f:
-        towny_data = json.load(f)
-except FileNotFoundError:
-    towny_data = {
-        "players": {},
-        "towns": {},
-        "nations": {},
-        "sieges": {},
-        "admin_logs": []
-    }
+commands_version = 0
+
+def load_commands():
+    """Load commands.json and compile it into the dispatch index"""
+    global commands_db, command_index, commands_version
+    with open('commands.json', 'r') as f:
+        commands_db = json.load(f)
+    # Admin commands only run from the panel, never from a prefixed chat line
+    command_index = CommandIndex(commands_db, exclude=("admin",))
+    commands_version += 1
+
+load_commands()
+
+serializer = Serializer(
+    config['towny'].get('serializer', 'auto'),
+    compact=config['towny'].get('compact_json', True)
+)
+
+# Towny data store of the main server (sections are loaded lazily on first access)
+towny_data = TownyStore(
+    config['towny'].get('database', 'towny_data.db'),
+    legacy_path='towny_data.json',
+    serializer=serializer,
+    slotted=config['towny'].get('slotted_records', True)
+)
+
+# One connection per Minecraft server: config["minecraft"] is the main one,
+# config["servers"] adds more, each with its own towny_data store
+server_pool = ServerPool(stale_after=config['minecraft'].get('stale_after', 300))
+server_pool.add(ServerState(config['minecraft'].get('name', 'main'), config['minecraft'], towny_data))
+for server_name, server_settings in config.get('servers', {}).items():
+    # Extra servers inherit the main server's chat and timeout settings
+    settings = dict(config['minecraft'], channel=None)
+    settings.update(server_settings)
+    server_pool.add(ServerState(
+        server_name,
+        settings,
+        TownyStore(
+            settings.get('database', f'towny_data-{server_name}.db'),
+            legacy_path=None,
+            serializer=serializer,
+            slotted=config['towny'].get('slotted_records', True)
+        )
+    ))
+
+# Lookup indexes for Discord commands, kept current as towny_data changes
+towny_index = server_pool.default.index
+
+# Rendered embeds and panel HTML. Entries are checked against the entity
+# they were built from and dropped here on every change, since a rename
+# changes the names a record reads without replacing it
+render_cache = RenderCache(config['web_panel'].get('render_cache_size', 1024))
+CACHED_SECTIONS = {"towns": "town", "nations": "nation", "sieges": "siege"}
+
+def invalidate_rendered(server_name):
+    def listener(section, key, value):
+        if section in CACHED_SECTIONS:
+            render_cache.invalidate(CACHED_SECTIONS[section], (server_name, key.lower()))
+    return listener
+
+for server in server_pool:
+    server.store.subscribe(invalidate_rendered(server.name))
+
+def api_item(key, entity):
+    item = dict(entity)
+    item.setdefault("name", key)
+    item["key"] = key
+    return item
+
+# Push channel for the web panel (chat, admin logs, siege and data changes)
+event_broker = EventBroker()
+
+def publish_store_change(server):
+    def listener(section, key, value):
+        if section == "sieges":
+            event_broker.publish("siege", {
+                "server": server.name, "key": key, "siege": api_item(key, value) if value is not None else None
+            })
+        else:
+            event_broker.publish("data", {"server": server.name, "version": server.store.version})
+    return listener
+
+for server in server_pool:
+    server.store.subscribe(publish_store_change(server))
+
+# Chat history and admin logs: recent entries in memory, everything on disk
+log_config = config['towny'].get('logs', {})
+chat_log = LogBook(
+    log_config.get('directory', 'logs'), "chat",
+    capacity=log_config.get('chat_buffer', 50),
+    max_bytes=log_config.get('max_file_bytes', 4 * 1024 * 1024),
+    max_files=log_config.get('max_files', 0)
+)
+admin_log = LogBook(
+    log_config.get('directory', 'logs'), "admin",
+    capacity=log_config.get('admin_buffer', 50),
+    max_bytes=log_config.get('max_file_bytes', 4 * 1024 * 1024),
+    max_files=log_config.get('max_files', 0),
+    flush_each=True
+)
+
+def log_admin_action(action, user):
+    entry = admin_log.append({
+        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "action": action,
+        "user": user
+    })
+    event_broker.publish("admin_log", entry)
+    return entry
+
+# Admin logs from an old towny_data.json move into the archive once
+for legacy_log in towny_data.take_admin_logs():
+    admin_log.append(legacy_log)
+
+# Chunk claims per world, kept out of towny_data in a compact binary file
+claims_file = config['towny'].get('claims_file', 'claims.bin')
+claim_index = ClaimIndex.load(claims_file)
+
+def drop_town_claims(section, key, value):
+    if section == "towns" and value is None:
+        claim_index.remove_town(key)
+
+towny_data.subscribe(drop_town_claims)
+
+# Balance transfers, accounts are "town:<name>", "nation:<name>" and "player:<name>"
+ledger_config = config['towny'].get('ledger', {})
+ledger = Ledger(
+    ledger_config.get('database', 'ledger.db'),
+    batch_size=ledger_config.get('batch_size', 256),
+    snapshot_every=ledger_config.get('snapshot_every', 10000)
+)
+ACCOUNT_SECTIONS = {"town": "towns", "nation": "nations", "player": "players"}
+
+def ledger_account(kind, name):
+    """Account id for a town/nation/player, opened with its towny_data balance on first use"""
+    account = f"{kind}:{name}"
+    entity = towny_data.get_entity(ACCOUNT_SECTIONS[kind], name)
+    if entity:
+        ledger.open(account, entity.get('balance', 0))
+    return account
+
+def record_transfer(debit, credit, amount, kind, memo=None):
+    """Add a transfer to the ledger and mirror the new balances into towny_data"""
+    tx = ledger.transfer(debit, credit, amount, kind, memo)
+    for account in (debit, credit):
+        section, _, name = account.partition(":")
+        section = ACCOUNT_SECTIONS.get(section)
+        if section and towny_data.get_entity(section, name) is not None:
+            towny_data.update(section, name, {"balance": ledger.balance(account)})
+    return tx
+
+def sync_balances(section, balances):
+    """Book balances read from the server's own Towny replies as "sync" transfers, {name: balance}"""
+    kind = next(kind for kind, account_section in ACCOUNT_SECTIONS.items() if account_section == section)
+    transfers = []
+    for name, balance in balances.items():
+        account = ledger_account(kind, name)
+        amount = balance - ledger.balance(account)
+        if amount > 0:
+            transfers.append((SERVER_ACCOUNT, account, amount, "sync", "Towny"))
+        elif amount < 0:
+            transfers.append((account, SERVER_ACCOUNT, -amount, "sync", "Towny"))
+    if transfers:
+        record_transfers(transfers)
+
+server_pool.default.ingestor.on_balances = sync_balances
 
-# Save towny data function
+def balance_transfers(operations, memo):
+    """Ledger transfers for give_balance/set_balance operations ({command, target, amount}).
+
+    Only the main server's economy is kept in the ledger. set_balance sees
+    the operations before it, so a batch can give and then set the same town.
+    """
+    balances = {}
+    transfers = []
+    for op in operations:
+        if op["command"] not in AMOUNT_COMMANDS:
+            continue
+        account = ledger_account("town", op["target"])
+        balance = balances.get(account, ledger.balance(account))
+        amount = op["amount"] - balance if op["command"] == "set_balance" else op["amount"]
+        balances[account] = balance + amount
+        if amount > 0:
+            transfers.append((SERVER_ACCOUNT, account, amount, op["command"], memo))
+        elif amount < 0:
+            transfers.append((account, SERVER_ACCOUNT, -amount, op["command"], memo))
+    return transfers
+
+def record_transfers(transfers):
+    """record_transfer() for (debit, credit, amount, kind, memo) tuples, committed to the ledger together"""
+    txs = ledger.transfer_many(transfers)
+    changes = {}
+    for debit, credit, *_ in transfers:
+        for account in (debit, credit):
+            section, _, name = account.partition(":")
+            section = ACCOUNT_SECTIONS.get(section)
+            if section and towny_data.get_entity(section, name) is not None:
+                changes.setdefault(section, {})[name] = {"balance": ledger.balance(account)}
+    for section, entities in changes.items():
+        towny_data.update_many(section, entities)
+    return txs
+
+# Siege deadlines, payouts and recurring jobs like auto-save
+scheduler = Scheduler(config['towny'].get('schedule_file', 'schedule.json'))
+discord_bot = None
+SIEGE_JOBS = ("siege_start", "siege_warning", "siege_end")
+
+def announce(text):
+    """Post to the Discord command channel from any thread"""
+    if discord_bot is not None:
+        discord_bot.announce(text)
+
+def track_siege(section, key, value):
+    """Put new sieges on the schedule and drop the jobs of removed or ended ones"""
+    if section != "sieges":
+        return
+    if value is None or value.get('status') == "ended" or value.get('ended_at'):
+        for kind in SIEGE_JOBS:
+            scheduler.cancel(kind, key)
+    elif not any(scheduler.due_at(kind, key) for kind in SIEGE_JOBS):
+        scheduler.schedule(time.time(), "siege_start", key)
+
+towny_data.subscribe(track_siege)
+
+def siege_start(key, payload):
+    siege = towny_data.get_entity("sieges", key)
+    if siege is None or siege.get('ended_at'):
+        return
+    started = siege.get('started_at') or time.time()
+    ends = started + siege.get('duration', config['siegewar']['siege_duration']) * 3600
+    # Schedule first, the update below runs track_siege again
+    scheduler.schedule(ends, "siege_end", key)
+    if ends - 3600 > time.time():
+        scheduler.schedule(ends - 3600, "siege_warning", key)
+    changes = {"started_at": started, "ends_at": ends, "status": siege.get('status') or "active"}
+    # Only a war chest the server reported (or the panel set) is held in
+    # escrow until the siege ends, and only from a nation we know
+    war_chest = siege.get('war_chest')
+    attacker = siege.get('attacker')
+    if not siege.get('started_at') and war_chest and attacker and towny_data.get_entity("nations", attacker) is not None:
+        record_transfer(ledger_account("nation", attacker), f"siege:{key}", war_chest, "war_chest")
+    towny_data.update("sieges", key, changes)
+    announce(f"⚔️ {siege.get('attacker') or 'Unknown'} has besieged {siege.get('defender', key)}!")
+
+def siege_warning(key, payload):
+    siege = towny_data.get_entity("sieges", key)
+    if siege is not None:
+        announce(f"⏳ The siege of {siege.get('defender', key)} ends in one hour")
+
+def siege_end(key, payload):
+    siege = towny_data.get_entity("sieges", key)
+    if siege is None:
+        return
+    attacker_won = bool(siege.get('attacker')) and siege.get('banner_control') == siege.get('attacker')
+    winner = siege['attacker'] if attacker_won else siege.get('defender', key)
+    escrow = ledger.balance(f"siege:{key}")
+    if escrow > 0:
+        record_transfer(f"siege:{key}", ledger_account("nation" if attacker_won else "town", winner), escrow, "war_chest_payout")
+    towny_data.update("sieges", key, {"status": "ended", "winner": winner, "ended_at": time.time()})
+    announce(f"🏳️ The siege of {siege.get('defender', key)} is over, {winner} wins" + (f" ${escrow:,.0f}" if escrow > 0 else ""))
+
+scheduler.on("siege_start", siege_start)
+scheduler.on("siege_warning", siege_warning)
+scheduler.on("siege_end", siege_end)
+
+# Stat history for charts and !stats, sampled by the scheduler
+history_config = config['towny'].get('history', {})
+history = History(history_config.get('directory', 'history'))
+HISTORY_METRICS = {
+    "town.balance": ("towns", lambda town: town.get('balance', 0)),
+    "town.residents": ("towns", lambda town: town.get('residents_count', len(town.get('residents', [])))),
+    "town.claims": ("towns", lambda town: town.get('claims', 0)),
+    "nation.balance": ("nations", lambda nation: nation.get('balance', 0)),
+    "nation.towns": ("nations", lambda nation: nation.get('towns_count', 0)),
+    "player.balance": ("players", lambda player: player.get('balance', 0)),
+}
+
+def sample_history():
+    sections = {section: towny_data.snapshot(section) for section in ("towns", "nations", "players")}
+    values = {}
+    for metric, (section, value_of) in HISTORY_METRICS.items():
+        values[metric] = {}
+        for key, entity in sections[section].items():
+            try:
+                values[metric][key] = float(value_of(entity) or 0)
+            except (TypeError, ValueError):
+                continue
+    history.record(values)
+
+# Save towny data function (only writes what changed)
 def save_towny_data():
-    with open('towny_data.json', 'w') as f:
-        json.dump(towny_data, f, indent=2)
+    with save_seconds.time():
+        chat_log.flush()
+        ledger.flush()
+        claims_saved = claim_index.save(claims_file)
+        scheduler.save()
+        history.save()
+        saved = 0
+        for server in server_pool:
+            rows = server.store.save()
+            if rows:
+                save_bytes.inc(server.store.last_save_bytes, server=server.name)
+            saved += rows
+    return saved or claims_saved
+
+# Instrumentation, scraped from /metrics
+metrics_config = config.get('metrics', {})
+metrics = Registry()
+command_seconds = metrics.histogram("towny_command_seconds", "Time to handle a bot command", ("source", "command"))
+command_errors = metrics.counter("towny_command_errors_total", "Bot commands that failed", ("source", "command"))
+http_seconds = metrics.histogram("towny_http_request_seconds", "Web panel request latency", ("route", "method", "status"))
+save_seconds = metrics.histogram("towny_save_seconds", "Duration of save_towny_data()", buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+save_bytes = metrics.counter("towny_save_bytes_total", "Entity JSON written to the database", ("server",))
+metrics.collector(
+    "towny_chat_sent_total", "Messages sent in game through bot.chat", "counter",
+    lambda: {(server.name,): server.chat_queue.stats["sent"] for server in server_pool}, ("server",)
+)
+metrics.collector(
+    "towny_chat_queue_depth", "Messages waiting to be sent in game", "gauge",
+    lambda: {(server.name,): server.chat_queue.depth() for server in server_pool}, ("server",)
+)
+metrics.collector(
+    "towny_minecraft_connects_total", "Minecraft connections made, including reconnects", "counter",
+    lambda: {(server.name,): server.bot.supervisor.connects if server.bot else 0 for server in server_pool}, ("server",)
+)
+metrics.collector(
+    "towny_ingest_lines_total", "Server chat lines parsed", "counter",
+    lambda: {(server.name,): server.ingestor.stats["lines"] for server in server_pool}, ("server",)
+)
+metrics.collector("towny_data_version", "Changes made to towny_data since startup", "counter", lambda: towny_data.version)
+metrics.collector("towny_sse_clients", "Connected panel event streams", "gauge", lambda: event_broker.client_count())
+metrics.collector("towny_scheduled_jobs", "Pending scheduler jobs", "gauge", lambda: len(scheduler))
+
+# Sampling profiler, started by config or the !profiler / /debug/profiler admin toggle
+profiler = SamplingProfiler(metrics_config.get('profiler_interval', 0.01))
 
 # Flask Web Panel
 app = Flask(__name__)
 web_running = False
+panel_template = None
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    http_seconds.observe(time.perf_counter() - g.request_start, route=route, method=request.method, status=response.status_code)
+    return response
 
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -72,19 +419,29 @@ HTML_TEMPLATE = """
     <div class="container">
         <h1>🏙️ Towny Bot Admin Panel</h1>
         
+        {% if servers|length > 1 %}
+        <div class="input-group">
+            <select id="server" onchange="reloadLists()">
+                {% for server in servers %}
+                <option value="{{ server }}">🖥️ {{ server }}</option>
+                {% endfor %}
+            </select>
+        </div>
+        {% endif %}
+        
         <div class="panel">
             <div class="stats">
                 <div class="stat-box">
                     <h3>📊 Total Towns</h3>
-                    <p>{{ towns_count }}</p>
+                    <p id="townsCount">{{ towns_count }}</p>
                 </div>
                 <div class="stat-box">
                     <h3>👥 Total Players</h3>
-                    <p>{{ players_count }}</p>
+                    <p id="playersCount">{{ players_count }}</p>
                 </div>
                 <div class="stat-box">
                     <h3>🏴 Total Nations</h3>
-                    <p>{{ nations_count }}</p>
+                    <p id="nationsCount">{{ nations_count }}</p>
                 </div>
             </div>
         </div>
@@ -123,46 +480,22 @@ HTML_TEMPLATE = """
             <h3>🏘️ Town Management</h3>
             <div class="input-group">
                 <input type="text" id="searchTown" placeholder="Search towns..." onkeyup="searchTowns()">
-                <button onclick="refreshTowns()">🔄 Refresh</button>
-            </div>
-            <div class="town-list" id="townList">
-                {% for town in towns %}
-                <div class="town-item">
-                    <h4>{{ town.name }} (Mayor: {{ town.mayor }})</h4>
-                    <p>💰 Balance: ${{ town.balance }} | 👥 Members: {{ town.residents_count }} | 📍 Claims: {{ town.claims }}</p>
-                    <p>🏴 Nation: {{ town.nation or 'None' }} | 📅 Founded: {{ town.founded_date }}</p>
-                    <button onclick="editTown('{{ town.name }}')">✏️ Edit</button>
-                    <button onclick="viewTownMembers('{{ town.name }}')">👥 Members</button>
-                </div>
-                {% endfor %}
+                <button onclick="loadPage('towns', true)">🔄 Refresh</button>
             </div>
+            <div class="town-list" id="townList"></div>
+            <button id="townsMore" onclick="loadPage('towns')" style="display: none">⬇️ Load more</button>
         </div>
 
         <div id="Nations" class="tabcontent">
             <h3>🏴 Nation Management</h3>
-            <div class="nation-list" id="nationList">
-                {% for nation in nations %}
-                <div class="nation-item">
-                    <h4>{{ nation.name }} (King: {{ nation.king }})</h4>
-                    <p>💰 Balance: ${{ nation.balance }} | 🏘️ Towns: {{ nation.towns_count }} | 👥 Capital: {{ nation.capital }}</p>
-                    <p>🤝 Allies: {{ nation.allies }} | ⚔️ Enemies: {{ nation.enemies }}</p>
-                    <button onclick="editNation('{{ nation.name }}')">✏️ Edit</button>
-                </div>
-                {% endfor %}
-            </div>
+            <div class="nation-list" id="nationList"></div>
+            <button id="nationsMore" onclick="loadPage('nations')" style="display: none">⬇️ Load more</button>
         </div>
 
         <div id="Sieges" class="tabcontent">
             <h3>⚔️ SiegeWar Dashboard</h3>
-            <div id="siegeList">
-                {% for siege in sieges %}
-                <div class="town-item">
-                    <h4>⚔️ {{ siege.attacker }} vs {{ siege.defender }}</h4>
-                    <p>⏰ Duration: {{ siege.duration }}h | 💰 War Chest: ${{ siege.war_chest }}</p>
-                    <p>🎯 Banner Control: {{ siege.banner_control }} | 🏆 Status: {{ siege.status }}</p>
-                </div>
-                {% endfor %}
-            </div>
+            <div id="siegeList"></div>
+            <button id="siegesMore" onclick="loadPage('sieges')" style="display: none">⬇️ Load more</button>
         </div>
 
         <div id="Admin" class="tabcontent">
@@ -179,11 +512,18 @@ HTML_TEMPLATE = """
                 <input type="text" id="adminValue" placeholder="Value/Amount">
                 <button onclick="executeAdminCommand()">Execute</button>
             </div>
+            <div class="input-group">
+                <textarea id="bulkCommands" rows="5" placeholder="command,target,value (one per line)"></textarea>
+                <button onclick="executeBulkCommands()">Run Batch</button>
+                <div id="bulkStatus"></div>
+            </div>
             <div class="chat-box">
                 <h4>Admin Logs:</h4>
+                <div id="adminLogs">
                 {% for log in admin_logs %}
                 <div>[{{ log.time }}] {{ log.action }} - {{ log.user }}</div>
                 {% endfor %}
+                </div>
             </div>
         </div>
     </div>
@@ -203,6 +543,17 @@ HTML_TEMPLATE = """
             evt.currentTarget.className += " active";
         }
 
+        const defaultServer = {{ server|tojson }};
+
+        function selectedServer() {
+            const select = document.getElementById('server');
+            return select ? select.value : null;
+        }
+
+        function currentServer() {
+            return selectedServer() || defaultServer;
+        }
+
         function sendChat() {
             const message = document.getElementById('chatInput').value;
             const target = document.getElementById('chatTarget').value;
@@ -212,7 +563,7 @@ HTML_TEMPLATE = """
                 fetch('/send_chat', {
                     method: 'POST',
                     headers: {'Content-Type': 'application/json'},
-                    body: JSON.stringify({message: message, target: target, custom: custom})
+                    body: JSON.stringify({message: message, target: target, custom: custom, server: selectedServer()})
                 });
                 document.getElementById('chatInput').value = '';
             }
@@ -226,19 +577,220 @@ HTML_TEMPLATE = """
             fetch('/admin_command', {
                 method: 'POST',
                 headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({command: command, target: target, value: value})
+                body: JSON.stringify({command: command, target: target, value: value, server: selectedServer()})
+            });
+        }
+
+        let bulkId = null;
+
+        function executeBulkCommands() {
+            const server = selectedServer();
+            fetch('/admin_bulk' + (server ? `?server=${encodeURIComponent(server)}` : ''), {
+                method: 'POST',
+                headers: {'Content-Type': 'text/csv'},
+                body: document.getElementById('bulkCommands').value
+            }).then(r => r.json()).then(result => {
+                const status = document.getElementById('bulkStatus');
+                if (result.errors) {
+                    status.innerHTML = escapeHtml(result.error) + '<br>' +
+                        result.errors.map(e => `Line ${e.line}: ${escapeHtml(e.error)}`).join('<br>');
+                } else if (result.error) {
+                    status.textContent = result.error;
+                } else {
+                    bulkId = result.id;
+                    status.textContent = `Batch #${result.id}: 0 / ${result.total} sent`;
+                }
             });
         }
 
+        function showBulkProgress(progress) {
+            if (progress.id !== bulkId) return;
+            const failed = progress.failed ? `, ${progress.failed} dropped` : '';
+            const done = progress.sent + progress.failed === progress.total ? ' ✅' : '';
+            document.getElementById('bulkStatus').textContent =
+                `Batch #${progress.id}: ${progress.sent} / ${progress.total} sent${failed}${done}`;
+        }
+
+        let dataVersion = {{ version }};
+        let dataEpoch = {{ epoch|tojson }};
+        let lastChatId = {{ last_chat_id }};
+        let lastLogId = {{ last_log_id }};
+        let lastEventId = {{ last_event_id }};
+        let refreshTimer = null;
+        let searchTimer = null;
+
+        function escapeHtml(value) {
+            return String(value == null ? '' : value).replace(/[&<>"']/g, c => ({
+                '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+            })[c]);
+        }
+
+        function townHtml(town) {
+            return `<div class="town-item" data-key="${escapeHtml(town.key)}">
+                <h4>${escapeHtml(town.name)} (Mayor: ${escapeHtml(town.mayor)})</h4>
+                <p>💰 Balance: $${escapeHtml(town.balance)} | 👥 Members: ${escapeHtml(town.residents_count)} | 📍 Claims: ${escapeHtml(town.claims)}</p>
+                <p>🏴 Nation: ${escapeHtml(town.nation || 'None')} | 📅 Founded: ${escapeHtml(town.founded_date)}</p>
+                <button onclick="editTown(this.parentNode.dataset.key)">✏️ Edit</button>
+                <button onclick="viewTownMembers(this.parentNode.dataset.key)">👥 Members</button>
+            </div>`;
+        }
+
+        function nationHtml(nation) {
+            return `<div class="nation-item" data-key="${escapeHtml(nation.key)}">
+                <h4>${escapeHtml(nation.name)} (King: ${escapeHtml(nation.king)})</h4>
+                <p>💰 Balance: $${escapeHtml(nation.balance)} | 🏘️ Towns: ${escapeHtml(nation.towns_count)} | 👥 Capital: ${escapeHtml(nation.capital)}</p>
+                <p>🤝 Allies: ${escapeHtml(nation.allies)} | ⚔️ Enemies: ${escapeHtml(nation.enemies)}</p>
+                <button onclick="editNation(this.parentNode.dataset.key)">✏️ Edit</button>
+            </div>`;
+        }
+
+        function siegeHtml(siege) {
+            return `<div class="town-item" data-key="${escapeHtml(siege.key)}">
+                <h4>⚔️ ${escapeHtml(siege.attacker)} vs ${escapeHtml(siege.defender)}</h4>
+                <p>⏰ Duration: ${escapeHtml(siege.duration)}h | 💰 War Chest: $${escapeHtml(siege.war_chest)}</p>
+                <p>🎯 Banner Control: ${escapeHtml(siege.banner_control)} | 🏆 Status: ${escapeHtml(siege.status)}</p>
+            </div>`;
+        }
+
+        const lists = {
+            towns: {el: 'townList', render: townHtml, cursor: null, query: '', loaded: false, token: 0},
+            nations: {el: 'nationList', render: nationHtml, cursor: null, query: '', loaded: false, token: 0},
+            sieges: {el: 'siegeList', render: siegeHtml, cursor: null, query: '', loaded: false, token: 0}
+        };
+
+        function loadPage(kind, reset) {
+            const list = lists[kind];
+            const token = ++list.token;
+            const params = new URLSearchParams({limit: 50, q: list.query, server: currentServer()});
+            if (list.cursor && !reset) params.set('cursor', list.cursor);
+            return fetch(`/api/${kind}?` + params).then(r => r.json()).then(page => {
+                if (token !== list.token) return null;
+                const el = document.getElementById(list.el);
+                if (reset) el.innerHTML = '';
+                el.insertAdjacentHTML('beforeend', page.items.map(list.render).join(''));
+                list.cursor = page.next_cursor;
+                list.loaded = true;
+                document.getElementById(kind + 'More').style.display = page.next_cursor ? '' : 'none';
+                return page;
+            });
+        }
+
+        // Reload every list from the selected server, then follow its changes
+        function reloadLists() {
+            return Promise.all(Object.keys(lists).map(kind => loadPage(kind, true))).then(pages => {
+                pages = pages.filter(page => page);
+                if (!pages.length) return;
+                dataVersion = Math.min(...pages.map(page => page.version));
+                dataEpoch = pages[0].epoch;
+                refresh();
+            });
+        }
+
+        function applyChanges(kind, changes) {
+            const list = lists[kind];
+            if (!list.loaded) return;
+            const el = document.getElementById(list.el);
+            const query = list.query.toLowerCase();
+            const findItem = key => el.querySelector(`[data-key="${CSS.escape(key)}"]`);
+            changes.removed.forEach(key => {
+                const item = findItem(key);
+                if (item) item.remove();
+            });
+            Object.entries(changes.updated).forEach(([key, data]) => {
+                const item = findItem(key);
+                if (item) {
+                    item.outerHTML = list.render(data);
+                    return;
+                }
+                const lower = key.toLowerCase();
+                // Only insert items that fall inside the range already loaded
+                if (!lower.startsWith(query) || (list.cursor && lower > list.cursor.toLowerCase())) return;
+                const next = Array.from(el.children).find(child => child.dataset.key.toLowerCase() > lower);
+                if (next) next.insertAdjacentHTML('beforebegin', list.render(data));
+                else el.insertAdjacentHTML('beforeend', list.render(data));
+            });
+        }
+
+        function refresh() {
+            const server = currentServer();
+            const params = new URLSearchParams({
+                since: dataVersion, epoch: dataEpoch, chat_since: lastChatId, log_since: lastLogId, server: server
+            });
+            fetch('/api/changes?' + params).then(r => r.json()).then(delta => {
+                if (server !== currentServer()) return;
+                if (delta.reset) {
+                    reloadLists();
+                    return;
+                }
+                dataVersion = delta.version;
+                ['towns', 'nations', 'sieges'].forEach(kind => {
+                    if (delta[kind]) applyChanges(kind, delta[kind]);
+                });
+                document.getElementById('townsCount').textContent = delta.counts.towns;
+                document.getElementById('playersCount').textContent = delta.counts.players;
+                document.getElementById('nationsCount').textContent = delta.counts.nations;
+                delta.chat_messages.forEach(appendChat);
+                delta.admin_logs.forEach(appendLog);
+            });
+        }
+
+        function scheduleRefresh() {
+            clearTimeout(refreshTimer);
+            refreshTimer = setTimeout(refresh, 1000);
+        }
+
+        function appendChat(msg) {
+            if (msg.id <= lastChatId) return;
+            document.getElementById('chatMessages').insertAdjacentHTML('beforeend',
+                `<div><strong>${escapeHtml(msg.sender)}:</strong> ${escapeHtml(msg.message)} <em>(${escapeHtml(msg.time)})</em></div>`);
+            lastChatId = msg.id;
+        }
+
+        function appendLog(log) {
+            if (log.id <= lastLogId) return;
+            const logs = document.getElementById('adminLogs');
+            logs.insertAdjacentHTML('beforeend', `<div>[${escapeHtml(log.time)}] ${escapeHtml(log.action)} - ${escapeHtml(log.user)}</div>`);
+            while (logs.children.length > 10) logs.firstElementChild.remove();
+            lastLogId = log.id;
+        }
+
+        function connectEvents() {
+            // The browser resends Last-Event-ID itself when it reconnects
+            const source = new EventSource(`/events?last_event_id=${lastEventId}`);
+            source.addEventListener('chat', e => appendChat(JSON.parse(e.data)));
+            source.addEventListener('admin_log', e => appendLog(JSON.parse(e.data)));
+            source.addEventListener('siege', e => {
+                const change = JSON.parse(e.data);
+                if (change.server !== currentServer()) return;
+                applyChanges('sieges', change.siege
+                    ? {updated: {[change.key]: change.siege}, removed: []}
+                    : {updated: {}, removed: [change.key]});
+            });
+            source.addEventListener('bulk', e => showBulkProgress(JSON.parse(e.data)));
+            source.addEventListener('data', e => {
+                if (JSON.parse(e.data).server === currentServer()) scheduleRefresh();
+            });
+            source.addEventListener('reset', refresh);
+        }
+
         function searchTowns() {
-            // Implement town search
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => {
+                lists.towns.query = document.getElementById('searchTown').value.trim();
+                loadPage('towns', true);
+            }, 250);
         }
 
         // Open default tab
         document.getElementsByClassName('tablinks')[0].click();
         
-        // Auto-refresh every 30 seconds
-        setInterval(() => { location.reload(); }, 30000);
+        // Load the first page of each list, then follow pushed changes
+        reloadLists();
+        if (window.EventSource) {
+            connectEvents();
+        } else {
+            setInterval(refresh, 30000);
+        }
     </script>
 </body>
 </html>
@@ -246,49 +798,61 @@ HTML_TEMPLATE = """
 
 class TownyManager:
     def __init__(self):
-        self.chat_messages = []
         self.last_save = time.time()
     
-    def add_chat_message(self, sender, message):
-        self.chat_messages.append({
+    def add_chat_message(self, sender, message, server=None):
+        entry = {
             "sender": sender,
             "message": message,
             "time": datetime.now().strftime("%H:%M:%S")
-        })
-        # Keep only last 50 messages
-        if len(self.chat_messages) > 50:
-            self.chat_messages.pop(0)
+        }
+        if server and len(server_pool) > 1:
+            entry["server"] = server
+        msg = chat_log.append(entry)
+        event_broker.publish("chat", msg)
+    
+    def messages_since(self, chat_id):
+        return chat_log.since(chat_id)
     
     def get_stats(self):
+        # Town, nation and siege lists are paged in by the panel through /api
         return {
-            "towns_count": len(towny_data.get("towns", {})),
-            "players_count": len(towny_data.get("players", {})),
-            "nations_count": len(towny_data.get("nations", {})),
-            "towns": list(towny_data.get("towns", {}).values()),
-            "nations": list(towny_data.get("nations", {}).values()),
-            "sieges": list(towny_data.get("sieges", {}).values()),
-            "chat_messages": self.chat_messages[-20:],  # Last 20 messages
-            "admin_logs": towny_data.get("admin_logs", [])[-10:]  # Last 10 logs
+            "version": towny_data.version,
+            "epoch": towny_data.epoch,
+            "last_chat_id": chat_log.last_id,
+            "last_log_id": admin_log.last_id,
+            "last_event_id": event_broker.last_id,
+            "towns_count": towny_data.count("towns"),
+            "players_count": towny_data.count("players"),
+            "nations_count": towny_data.count("nations"),
+            "server": server_pool.default.name,
+            "servers": list(server_pool.servers),
+            "chat_messages": chat_log.latest(20),  # Last 20 messages
+            "admin_logs": admin_log.latest(10)  # Last 10 logs
         }
 
 towny_manager = TownyManager()
 
 @app.route('/')
 def admin_panel():
-    stats = towny_manager.get_stats()
-    return render_template_string(HTML_TEMPLATE, **stats)
+    global panel_template
+    if panel_template is None:
+        panel_template = app.jinja_env.from_string(HTML_TEMPLATE)
+    version = (towny_data.version, chat_log.last_id, admin_log.last_id, event_broker.last_id)
+    return render_cache.get("panel", None, version, lambda: panel_template.render(**towny_manager.get_stats()))
 
 @app.route('/send_chat', methods=['POST'])
 def send_chat():
     data = request.json
-    towny_manager.add_chat_message("Admin", data['message'])
+    server = request_server(data.get('server'))
+    if server is None:
+        return {"error": f"Unknown server {data.get('server')}"}, 404
+    towny_manager.add_chat_message("Admin", data['message'], server.name)
     
     # Send to Minecraft
-    if mc_bot and mc_bot.bot:
-        chat_command = f"say [Admin] {data['message']}"
-        mc_bot.bot.chat(chat_command)
+    server.chat_queue.put(f"say [Admin] {data['message']}", PRIORITY_CHAT)
     
-    return {"status": "success"}
+    return {"status": "success", "server": server.name, "healthy": server.healthy}
 
 @app.route('/admin_command', methods=['POST'])
 def admin_command():
@@ -296,59 +860,401 @@ def admin_command():
     command = data['command']
     target = data['target']
     value = data['value']
+    server = request_server(data.get('server'))
+    if server is None:
+        return {"error": f"Unknown server {data.get('server')}"}, 404
+    
+    operations, errors = validate_batch(parse_batch(items=[{"command": command, "target": target, "value": value}]), command_index)
+    if errors:
+        return {"error": errors[0]["error"]}, 400
+    operation = operations[0]
     
     # Log admin action
-    towny_data["admin_logs"].append({
-        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "action": f"{command} on {target} with {value}",
-        "user": "Web Panel"
-    })
-    save_towny_data()
+    log_admin_action(f"{command} on {target} with {value}" + (f" ({server.name})" if len(server_pool) > 1 else ""), "Web Panel")
     
     # Execute in Minecraft
-    if mc_bot and mc_bot.bot:
-        if command in commands_db["admin"]:
-            cmd_template = commands_db["admin"][command]
-            cmd = cmd_template.replace("{town}", target).replace("{amount}", value)
-            mc_bot.bot.chat(f"/{cmd}")
+    server.chat_queue.put(operation["message"], PRIORITY_ADMIN)
+    
+    if server is server_pool.default:
+        transfers = balance_transfers(operations, "Web Panel")
+        if transfers:
+            record_transfers(transfers)
+    
+    return {"status": "command_executed", "server": server.name, "healthy": server.healthy}
+
+# Bulk admin requests, the most recent ones are kept for /api/admin_bulk/<id>
+bulk_runs = OrderedDict()
+bulk_ids = itertools.count(1)
+bulk_lock = threading.Lock()
+
+def publish_bulk_progress(run, item):
+    event_broker.publish("bulk", {
+        "id": run.id, "index": item["index"], "status": item["status"],
+        "sent": run.sent, "failed": run.failed, "total": len(run.items)
+    })
+    if run.done:
+        server = server_pool.servers.get(run.server)
+        if server is not None:
+            for listeners, listener in ((server.sent_listeners, run.message_sent),
+                                        (server.dropped_listeners, run.message_dropped)):
+                if listener in listeners:
+                    listeners.remove(listener)
+
+@app.route('/admin_bulk', methods=['POST'])
+def admin_bulk():
+    """Run a CSV (text/csv, command,target,value) or JSON ({"commands": [...]}) batch of admin commands.
+
+    Everything is validated before anything runs. State changes are
+    committed once, the in-game commands are paced through the chat queue
+    and progress arrives as "bulk" events on /events.
+    """
+    if request.mimetype == 'text/csv':
+        batch = parse_batch(text=request.get_data(as_text=True))
+        server_name = request.args.get('server')
+    else:
+        data = request.get_json(silent=True) or {}
+        batch = parse_batch(items=data.get('commands') if isinstance(data, dict) else data)
+        server_name = request.args.get('server') or (data.get('server') if isinstance(data, dict) else None)
+    server = request_server(server_name)
+    if server is None:
+        return {"error": f"Unknown server {server_name}"}, 404
+    max_items = config['web_panel'].get('bulk_max_items', 5000)
+    if not batch:
+        return {"error": "No commands"}, 400
+    if len(batch) > max_items:
+        return {"error": f"At most {max_items} commands per request"}, 400
+    
+    operations, errors = validate_batch(batch, command_index)
+    if errors:
+        return {"error": f"{len(errors)} invalid commands, nothing was run", "errors": errors}, 400
+    
+    if server is server_pool.default:
+        transfers = balance_transfers(operations, "Web Panel bulk")
+        if transfers:
+            record_transfers(transfers)
+    
+    with bulk_lock:
+        run_id = next(bulk_ids)
+        counts = {}
+        for op in operations:
+            counts[op["command"]] = counts.get(op["command"], 0) + 1
+        summary = ", ".join(f"{count} {command}" for command, count in counts.items())
+        log_admin_action(
+            f"Bulk #{run_id}: {summary}" + (f" ({server.name})" if len(server_pool) > 1 else ""), "Web Panel"
+        )
+        save_towny_data()
+        
+        run = BulkRun(
+            run_id, server.name, [op["message"] for op in operations], server.chat_queue, PRIORITY_COMMAND,
+            window=config['web_panel'].get('bulk_window', 20), on_progress=publish_bulk_progress
+        )
+        bulk_runs[run_id] = run
+        while len(bulk_runs) > 50:
+            bulk_runs.popitem(last=False)
+        server.sent_listeners.append(run.message_sent)
+        server.dropped_listeners.append(run.message_dropped)
+    run.start()
+    
+    return {"status": "queued", "id": run_id, "total": len(operations), "server": server.name, "healthy": server.healthy}, 202
+
+@app.route('/api/admin_bulk/<int:run_id>')
+def admin_bulk_status(run_id):
+    run = bulk_runs.get(run_id)
+    if run is None:
+        return {"error": "Unknown bulk request"}, 404
+    return jsonify(run.state())
+
+def request_server(name):
+    """ServerState named in a request, the main server if none is given, None if unknown"""
+    try:
+        return server_pool.get(name)
+    except KeyError:
+        return None
+
+def etag_response(etag, build):
+    """Answer 304 when the client already has this version, otherwise build the JSON body"""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/<any(towns, nations, sieges):section>')
+def api_list(section):
+    cursor = request.args.get('cursor') or None
+    query = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+    server = request_server(request.args.get('server'))
+    if server is None:
+        return {"error": "Unknown server"}, 404
+    store = server.store
+    
+    def build():
+        names, next_cursor = server.index.page(section, cursor, query, limit)
+        items = []
+        for name in names:
+            entity = store.get_entity(section, name)
+            if entity is not None:
+                items.append(api_item(name, entity))
+        return {"items": items, "next_cursor": next_cursor, "version": store.version, "epoch": store.epoch}
     
-    return {"status": "command_executed"}
+    return etag_response(f"{server.name}-{section}-{store.epoch}-v{store.version}", build)
 
-def run_web_panel():
-    app.run(host='0.0.0.0', port=config['web_panel']['port'])
+@app.route('/api/changes')
+def api_changes():
+    since = request.args.get('since', 0, type=int)
+    epoch = request.args.get('epoch')
+    chat_since = request.args.get('chat_since', 0, type=int)
+    log_since = request.args.get('log_since', 0, type=int)
+    server = request_server(request.args.get('server'))
+    if server is None:
+        return {"error": "Unknown server"}, 404
+    store = server.store
+    
+    def build():
+        version = store.version
+        changed = store.changes_since(since, epoch)
+        if changed is None:
+            return {"reset": True, "version": version, "epoch": store.epoch}
+        
+        delta = {
+            "version": version,
+            "epoch": store.epoch,
+            "counts": {
+                "towns": store.count("towns"),
+                "players": store.count("players"),
+                "nations": store.count("nations")
+            },
+            "chat_messages": towny_manager.messages_since(chat_since),
+            "admin_logs": admin_log.since(log_since)
+        }
+        for section in ("towns", "nations", "sieges"):
+            if section in changed:
+                updated, removed = {}, []
+                for key in changed[section]:
+                    entity = store.get_entity(section, key)
+                    if entity is None:
+                        removed.append(key)
+                    else:
+                        updated[key] = api_item(key, entity)
+                delta[section] = {"updated": updated, "removed": removed}
+        return delta
+    
+    return etag_response(f"changes-{server.name}-{store.epoch}-v{store.version}-c{chat_log.last_id}-l{admin_log.last_id}", build)
+
+def parse_time(value):
+    """Epoch seconds or an ISO date/time from a query string"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+@app.route('/api/logs/<any(chat, admin):kind>')
+def api_logs(kind):
+    """Search archived chat or admin logs by time range, newest first"""
+    try:
+        start = parse_time(request.args.get('start'))
+        end = parse_time(request.args.get('end'))
+    except ValueError:
+        return {"error": "start/end must be epoch seconds or ISO dates"}, 400
+    book = chat_log if kind == "chat" else admin_log
+    entries = book.query(
+        start, end,
+        contains=request.args.get('q') or None,
+        offset=max(0, request.args.get('offset', 0, type=int)),
+        limit=max(1, min(request.args.get('limit', 100, type=int), 500))
+    )
+    return {"entries": entries}
+
+MAX_CLAIM_BOX = 512
+
+def claim_args(*names):
+    """Integer query args, raises ValueError if one is missing or malformed"""
+    return [int(request.args[name]) for name in names]
+
+@app.route('/api/claims', methods=['GET'])
+def api_claims():
+    """Claimed chunks inside a box, for map views"""
+    world = request.args.get('world', 'world')
+    try:
+        x0, z0, x1, z1 = claim_args('x0', 'z0', 'x1', 'z1')
+    except (KeyError, ValueError):
+        return {"error": "x0, z0, x1 and z1 are required integers"}, 400
+    x0, x1 = min(x0, x1), max(x0, x1)
+    z0, z1 = min(z0, z1), max(z0, z1)
+    if x1 - x0 >= MAX_CLAIM_BOX or z1 - z0 >= MAX_CLAIM_BOX:
+        return {"error": f"Box is limited to {MAX_CLAIM_BOX}x{MAX_CLAIM_BOX} chunks"}, 400
+    return {"world": world, "claims": claim_index.query_box(world, x0, z0, x1, z1)}
+
+@app.route('/api/claims/at')
+def api_claim_at():
+    """Owner of one chunk and of the chunks around it, ?town=X also says if X could claim it"""
+    world = request.args.get('world', 'world')
+    try:
+        x, z = claim_args('x', 'z')
+    except (KeyError, ValueError):
+        return {"error": "x and z are required integers"}, 400
+    neighbours = claim_index.neighbours(world, x, z)
+    result = {
+        "world": world, "x": x, "z": z,
+        "owner": claim_index.owner(world, x, z),
+        "neighbours": [{"x": nx, "z": nz, "owner": owner} for (nx, nz), owner in neighbours.items()]
+    }
+    if request.args.get('town'):
+        result["adjacent"] = claim_index.is_adjacent(world, x, z, request.args['town'])
+    return result
+
+@app.route('/api/claims', methods=['POST'])
+def api_update_claims():
+    """Apply a batch of claims/unclaims, e.g. {"world": "world", "town": "A", "claim": [[0, 0]], "unclaim": [[1, 0]]}"""
+    data = request.get_json(silent=True) or {}
+    world = data.get('world', 'world')
+    town = data.get('town')
+    try:
+        claim = [(int(x), int(z)) for x, z in data.get('claim', [])]
+        unclaim = [(int(x), int(z)) for x, z in data.get('unclaim', [])]
+    except (TypeError, ValueError):
+        return {"error": "claim/unclaim must be lists of [x, z]"}, 400
+    if claim and not town:
+        return {"error": "town is required to claim"}, 400
+    
+    touched = set()
+    for x, z in unclaim:
+        touched.add(claim_index.unclaim(world, x, z))
+    for x, z in claim:
+        touched.add(claim_index.claim(world, x, z, town))
+        touched.add(town)
+    touched.discard(None)
+    # The index only holds chunks posted here, so its counts are returned but
+    # towny_data keeps the ones Towny reports (Town Size)
+    
+    log_admin_action(f"Claims in {world}: +{len(claim)} -{len(unclaim)}" + (f" for {town}" if town else ""), "Web Panel")
+    return {"status": "success", "towns": {name: claim_index.claim_count(name) for name in touched}}
+
+@app.route('/api/ledger/<account>')
+def api_ledger(account):
+    """Balance and transfer history of one account, ?at= gives the balance at a point in time"""
+    try:
+        at = parse_time(request.args.get('at'))
+    except ValueError:
+        return {"error": "at must be epoch seconds or an ISO date"}, 400
+    result = {"account": account, "balance": ledger.balance(account)}
+    if at is not None:
+        result["balance_at"] = ledger.balance_at(account, at)
+    result["history"] = ledger.history(
+        account,
+        before=request.args.get('before', type=int),
+        limit=max(1, min(request.args.get('limit', 50, type=int), 500))
+    )
+    return result
+
+@app.route('/api/history/<metric>')
+def api_history(metric):
+    """Series of one entity (?entity=), or the top n (?top=n) at ?at, ranked by change since ?since if given"""
+    if metric not in HISTORY_METRICS:
+        return {"error": f"Unknown metric, use one of {', '.join(HISTORY_METRICS)}"}, 404
+    try:
+        start = parse_time(request.args.get('start'))
+        end = parse_time(request.args.get('end'))
+        at = parse_time(request.args.get('at'))
+        since = parse_time(request.args.get('since'))
+    except ValueError:
+        return {"error": "Times must be epoch seconds or ISO dates"}, 400
+    entity = request.args.get('entity')
+    if entity:
+        return {"metric": metric, "entity": entity, "points": history.range(metric, entity, start, end)}
+    n = max(1, min(request.args.get('top', 10, type=int), 100))
+    return {"metric": metric, "top": history.top(metric, n, at, since)}
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/profiler', methods=['GET', 'POST'])
+def profiler_toggle():
+    """POST {"action": "start"|"stop"} toggles the profiler, GET returns folded stacks so far"""
+    if request.method == 'POST':
+        action = (request.get_json(silent=True) or {}).get('action')
+        if action not in ("start", "stop"):
+            return {"error": "action must be start or stop"}, 400
+        changed = profiler.start() if action == "start" else profiler.stop()
+        if changed:
+            log_admin_action(f"Profiler {action}", "Web Panel")
+        return {"running": profiler.running, "samples": profiler.samples}
+    return Response(profiler.folded(), mimetype='text/plain')
+
+@app.route('/api/render_cache')
+def render_cache_stats():
+    return render_cache.get_stats()
+
+@app.route('/api/chat_queue')
+def chat_queue_stats():
+    server = request_server(request.args.get('server'))
+    if server is None:
+        return {"error": "Unknown server"}, 404
+    return server.chat_queue.get_stats()
+
+@app.route('/api/ingest')
+def ingest_stats():
+    server = request_server(request.args.get('server'))
+    if server is None:
+        return {"error": "Unknown server"}, 404
+    return dict(server.ingestor.stats, depth=server.ingestor.depth())
+
+@app.route('/api/servers')
+def servers_health():
+    return {"default": server_pool.default.name, "servers": server_pool.health()}
 
 # Minecraft Bot
 class MinecraftBot:
-    def __init__(self):
+    def __init__(self, server):
+        self.server = server
+        self.settings = server.settings
         self.bot = None
-        self.connect_minecraft()
+        self.connected = False
+        self.supervisor = Supervisor(f"Minecraft ({server.name})", self.connect_minecraft)
     
     def connect_minecraft(self):
-        try:
-            self.bot = Bot({
-                'host': config['minecraft']['host'],
-                'port': config['minecraft']['port'],
-                'username': config['minecraft']['username'],
-                'version': config['minecraft']['version']
-            })
-            
-            self.setup_events()
-            print("✅ Minecraft Towny Bot Connected!")
-            
-        except Exception as e:
-            print(f"❌ Minecraft connection failed: {e}")
-            # Retry after 30 seconds
-            threading.Timer(30, self.connect_minecraft).start()
+        """Connect once, the supervisor retries with backoff if this raises"""
+        self.bot = Bot({
+            'host': self.settings['host'],
+            'port': self.settings['port'],
+            'username': self.settings['username'],
+            'version': self.settings['version']
+        })
+        
+        self.setup_events()
+        print(f"✅ Minecraft Towny Bot Connected to {self.server.name}!")
+    
+    def disconnect(self):
+        self.connected = False
+        if self.bot is not None:
+            try:
+                self.bot.quit()
+            except Exception as e:
+                print(f"❌ Minecraft disconnect failed: {e}")
     
     def setup_events(self):
+        bot = self.bot
+        
+        @self.bot.on('spawn')
+        def on_spawn():
+            self.connected = True
+            self.supervisor.connected()
+        
         @self.bot.on('message')
         def on_message(json_msg):
             message = json_msg.toString()
-            print(f"📨 {message}")
+            print(f"📨 [{self.server.name}] {message}")
+            self.server.message_received(message)
             
             # Log chat messages
             if not message.startswith(config['prefix']):
-                towny_manager.add_chat_message("Minecraft", message)
+                towny_manager.add_chat_message("Minecraft", message, self.server.name)
             
             # Handle commands
             if message.startswith(config['prefix']):
@@ -360,27 +1266,62 @@ class MinecraftBot:
         
         @self.bot.on('end')
         def on_end():
-            print("🔌 Disconnected from Minecraft. Reconnecting...")
-            threading.Timer(5, self.connect_minecraft).start()
+            # Ignore late events from a bot that has already been replaced
+            if bot is not self.bot:
+                return
+            self.connected = False
+            print(f"🔌 Disconnected from {self.server.name}. Reconnecting... ({self.server.chat_queue.depth()} messages queued)")
+            self.supervisor.request_reconnect()
     
     def handle_command(self, message):
+        start = time.perf_counter()
+        name = "unknown"
         try:
-            command = message[len(config['prefix']):].split()[0]
-            args = message[len(config['prefix']):].split()[1:]
-            
-            # Find and execute command
-            for category, cmds in commands_db.items():
-                if command in cmds:
-                    cmd_template = cmds[command]
-                    # Simple argument replacement
-                    for i, arg in enumerate(args):
-                        cmd_template = cmd_template.replace(f"{{{'param'+str(i+1)}}}", arg)
-                    
-                    self.bot.chat(f"/{cmd_template}")
-                    break
-                    
+            match = command_index.resolve(message[len(config['prefix']):].split())
+            if match:
+                compiled, args = match
+                name = f"{compiled.category}.{compiled.name}"
+                self.server.chat_queue.put(f"/{compiled.format(args)}", PRIORITY_COMMAND)
+                if self.server is server_pool.default:
+                    self.record_payment(compiled, args)
+                
+        except CommandUsageError as e:
+            print(f"⚠️ {e}")
+            command_errors.inc(source="minecraft", command=name)
         except Exception as e:
             print(f"❌ Command error: {e}")
+            command_errors.inc(source="minecraft", command=name)
+        finally:
+            command_seconds.observe(time.perf_counter() - start, source="minecraft", command=name)
+
+    def record_payment(self, compiled, args):
+        """Ledger entry for money commands, which the server runs as the bot's own player"""
+        if compiled.name not in ("deposit", "withdraw", "pay"):
+            return
+        try:
+            amount = float(args[compiled.fields.index("amount")])
+        except (IndexError, ValueError):
+            return
+        if amount <= 0:
+            return
+        username = self.settings['username']
+        player = ledger_account("player", username)
+        if compiled.category == "player":
+            other = ledger_account("player", args[compiled.fields.index("player")])
+        else:
+            town = towny_index.town_of(username)
+            if town is None:
+                return
+            other = ledger_account("town", town)
+            if compiled.category == "nation":
+                nation = towny_index.nation_of(town)
+                if nation is None:
+                    return
+                other = ledger_account("nation", nation)
+        if compiled.name == "withdraw":
+            record_transfer(other, player, amount, compiled.name, "Minecraft")
+        else:
+            record_transfer(player, other, amount, compiled.name, "Minecraft")
 
 # Discord Bot
 class DiscordBot:
@@ -392,9 +1333,33 @@ class DiscordBot:
             intents=intents,
             help_command=None
         )
+        self.loop = asyncio.get_running_loop()
         self.setup_commands()
     
+    def announce(self, text):
+        """Send text to the command channel, safe to call from worker threads"""
+        channel = discord.utils.get(self.bot.get_all_channels(), name=config['discord']['command_channel'])
+        if channel is not None:
+            asyncio.run_coroutine_threadsafe(channel.send(text), self.loop)
+    
+    @staticmethod
+    def server_for(ctx):
+        """Server a Discord channel is mapped to (config "channel"), and its lookup index"""
+        server = server_pool.for_channel(getattr(ctx.channel, 'name', None))
+        return server, server.index
+    
     def setup_commands(self):
+        @self.bot.before_invoke
+        async def start_command_timer(ctx):
+            ctx.metrics_start = time.perf_counter()
+        
+        @self.bot.after_invoke
+        async def record_command_time(ctx):
+            name = ctx.command.name if ctx.command else "unknown"
+            if ctx.command_failed:
+                command_errors.inc(source="discord", command=name)
+            command_seconds.observe(time.perf_counter() - ctx.metrics_start, source="discord", command=name)
+        
         @self.bot.event
         async def on_ready():
             print(f'✅ Discord Bot Ready: {self.bot.user}')
@@ -403,87 +1368,234 @@ class DiscordBot:
         @self.bot.command(name='help')
         async def help_command(ctx):
             """Show all available commands"""
-            embed = discord.Embed(
-                title="🏙️ Towny Bot Commands",
-                description="**Prefix:** `!`\n\n**Categories:**",
-                color=0x00ff00
-            )
-            
-            for category, cmds in commands_db.items():
-                cmd_list = "\n".join([f"`{cmd}`" for cmd in cmds.keys()])
-                embed.add_field(
-                    name=f"**{category.upper()}**",
-                    value=cmd_list,
-                    inline=True
+            def build():
+                embed = discord.Embed(
+                    title="🏙️ Towny Bot Commands",
+                    description="**Prefix:** `!`\n\n**Categories:**",
+                    color=0x00ff00
                 )
+                
+                for category, cmds in commands_db.items():
+                    cmd_list = "\n".join([f"`{cmd}`" for cmd in cmds.keys()])
+                    embed.add_field(
+                        name=f"**{category.upper()}**",
+                        value=cmd_list,
+                        inline=True
+                    )
+                
+                embed.set_footer(text="Use !<command> to execute. Admin panel: /admin")
+                return embed
             
-            embed.set_footer(text="Use !<command> to execute. Admin panel: /admin")
-            await ctx.send(embed=embed)
+            await ctx.send(embed=render_cache.get("help", None, commands_version, build))
         
         @self.bot.command(name='town')
-        async def town_info(ctx, town_name=None):
+        async def town_info(ctx, town_name=None, count=None):
             """Get town information"""
+            server, index = self.server_for(ctx)
             if not town_name:
                 await ctx.send("❌ Please specify a town name: `!town <town_name>`")
                 return
             
-            # Get town data or simulate
-            embed = discord.Embed(
-                title=f"🏘️ Town: {town_name}",
-                color=0x3498db
-            )
+            if town_name.lower() == "top" and not index.find_town(town_name):
+                limit = min(int(count), 25) if count and count.isdigit() else 10
+                embed = discord.Embed(title="🏆 Richest Towns", color=0x3498db)
+                lines = []
+                for i, name in enumerate(index.top_towns(limit), 1):
+                    town = index.find_town(name) or {}
+                    lines.append(f"**{i}.** {name} - ${town.get('balance', 0):,}")
+                embed.description = "\n".join(lines) or "No towns yet"
+                await ctx.send(embed=embed)
+                return
             
-            embed.add_field(name="Mayor", value="Player1", inline=True)
-            embed.add_field(name="Balance", value="$1,000", inline=True)
-            embed.add_field(name="Members", value="5", inline=True)
-            embed.add_field(name="Nation", value="None", inline=True)
-            embed.add_field(name="Claims", value="10", inline=True)
-            embed.add_field(name="Founded", value="2024-01-01", inline=True)
+            town = index.find_town(town_name)
+            if town is None:
+                # Fall back to the town of a player with that name
+                player_town = index.town_of(town_name)
+                town = index.find_town(player_town) if player_town else None
+            if town is None:
+                matches = index.search_towns(town_name, 5)
+                hint = f" Did you mean: {', '.join(matches)}?" if matches else ""
+                await ctx.send(f"❌ Town `{town_name}` not found.{hint}")
+                return
             
-            await ctx.send(embed=embed)
+            def build():
+                embed = discord.Embed(
+                    title=f"🏘️ Town: {town.get('name', town_name)}",
+                    color=0x3498db
+                )
+                
+                embed.add_field(name="Mayor", value=town.get('mayor') or "None", inline=True)
+                embed.add_field(name="Balance", value=f"${town.get('balance', 0):,}", inline=True)
+                embed.add_field(name="Members", value=str(town.get('residents_count', len(town.get('residents', [])))), inline=True)
+                embed.add_field(name="Nation", value=town.get('nation') or "None", inline=True)
+                embed.add_field(name="Claims", value=str(town.get('claims', 0)), inline=True)
+                embed.add_field(name="Founded", value=town.get('founded_date') or "Unknown", inline=True)
+                return embed
+            
+            await ctx.send(embed=render_cache.get("town", (server.name, town.get('name', town_name).lower()), town, build))
         
         @self.bot.command(name='nation')
         async def nation_info(ctx, nation_name=None):
             """Get nation information"""
+            server, index = self.server_for(ctx)
             if not nation_name:
                 await ctx.send("❌ Please specify a nation name: `!nation <nation_name>`")
                 return
             
-            embed = discord.Embed(
-                title=f"🏴 Nation: {nation_name}",
-                color=0xe74c3c
-            )
+            nation = index.find_nation(nation_name)
+            if nation is None:
+                matches = index.search_nations(nation_name, 5)
+                hint = f" Did you mean: {', '.join(matches)}?" if matches else ""
+                await ctx.send(f"❌ Nation `{nation_name}` not found.{hint}")
+                return
             
-            embed.add_field(name="King", value="Player2", inline=True)
-            embed.add_field(name="Balance", value="$5,000", inline=True)
-            embed.add_field(name="Towns", value="3", inline=True)
-            embed.add_field(name="Capital", value="CapitalTown", inline=True)
-            embed.add_field(name="Allies", value="2", inline=True)
-            embed.add_field(name="Enemies", value="1", inline=True)
+            name = nation.get('name', nation_name)
+            towns = index.towns_of(name)
             
-            await ctx.send(embed=embed)
+            def build():
+                embed = discord.Embed(
+                    title=f"🏴 Nation: {name}",
+                    color=0xe74c3c
+                )
+                
+                embed.add_field(name="King", value=nation.get('king') or "None", inline=True)
+                embed.add_field(name="Balance", value=f"${nation.get('balance', 0):,}", inline=True)
+                embed.add_field(name="Towns", value=str(nation.get('towns_count', len(towns))), inline=True)
+                embed.add_field(name="Capital", value=nation.get('capital') or "None", inline=True)
+                embed.add_field(name="Allies", value=", ".join(nation.get('allies', [])) or "None", inline=True)
+                embed.add_field(name="Enemies", value=", ".join(nation.get('enemies', [])) or "None", inline=True)
+                return embed
+            
+            # The member count comes from the index, so it is part of the version
+            await ctx.send(embed=render_cache.get("nation", (server.name, name.lower()), (nation, len(towns)), build))
         
         @self.bot.command(name='siege')
         async def siege_info(ctx, town_name=None):
             """Get siege information"""
+            server, index = self.server_for(ctx)
             if not town_name:
                 await ctx.send("❌ Please specify a town: `!siege <town_name>`")
                 return
             
+            siege = index.find_siege(town_name)
+            if siege is None:
+                await ctx.send(f"🕊️ `{town_name}` is not under siege.")
+                return
+            
+            def build():
+                embed = discord.Embed(
+                    title=f"⚔️ Siege: {siege.get('defender', town_name)}",
+                    color=0xf39c12
+                )
+                
+                embed.add_field(name="Attacker", value=siege.get('attacker') or "Unknown", inline=True)
+                embed.add_field(name="Defender", value=siege.get('defender') or town_name, inline=True)
+                embed.add_field(name="Duration", value=f"{siege.get('duration', config['siegewar']['siege_duration'])}h", inline=True)
+                embed.add_field(name="War Chest", value=f"${siege.get('war_chest', 0):,}", inline=True)
+                embed.add_field(name="Banner Control", value=siege.get('banner_control') or "None", inline=True)
+                embed.add_field(name="Status", value=siege.get('status') or "Unknown", inline=True)
+                if siege.get('ends_at') and siege.get('status') != "ended":
+                    embed.add_field(name="Ends", value=datetime.fromtimestamp(siege['ends_at']).strftime('%Y-%m-%d %H:%M'), inline=True)
+                return embed
+            
+            await ctx.send(embed=render_cache.get("siege", (server.name, siege.get('defender', town_name).lower()), siege, build))
+        
+        @self.bot.command(name='reload_commands')
+        async def reload_commands(ctx):
+            """Reload commands.json"""
+            if not any(role.name in config['discord']['admin_roles'] for role in ctx.author.roles):
+                await ctx.send("❌ You don't have permission to reload commands.")
+                return
+            
+            await asyncio.get_running_loop().run_in_executor(None, load_commands)
+            await ctx.send(f"🔄 Reloaded {len(command_index.by_name)} commands")
+        
+        @self.bot.command(name='ledger')
+        async def ledger_info(ctx, kind=None, name=None):
+            """Balance and recent transfers of a town, nation or player"""
+            if kind not in ACCOUNT_SECTIONS or not name:
+                await ctx.send("❌ Usage: `!ledger <town|nation|player> <name>`")
+                return
+            
+            account = f"{kind}:{name}"
+            # Older transfers are read from SQLite
+            transfers = await asyncio.get_running_loop().run_in_executor(None, lambda: ledger.history(account, limit=5))
             embed = discord.Embed(
-                title=f"⚔️ Siege: {town_name}",
-                color=0xf39c12
+                title=f"📒 Ledger: {name}",
+                description=f"Balance: ${ledger.balance(account):,.2f}",
+                color=0xf1c40f
             )
+            for tx in transfers:
+                other = tx['debit'] if tx['change'] > 0 else tx['credit']
+                embed.add_field(
+                    name=f"{datetime.fromtimestamp(tx['ts']).strftime('%Y-%m-%d %H:%M')} · {tx['kind']}",
+                    value=f"{tx['change']:+,.2f} ({other}) → ${tx['balance']:,.2f}",
+                    inline=False
+                )
+            await ctx.send(embed=embed)
+        
+        @self.bot.command(name='stats')
+        async def stats_info(ctx, town_name=None, days=None):
+            """Town balance, residents and claims over time, or `!stats top [days]` for the biggest earners"""
+            days = int(days) if days and days.isdigit() else 7
+            since = time.time() - days * 86400
+            if not town_name or town_name.lower() == "top":
+                lines = [
+                    f"**{i}.** {name} {change:+,.0f}"
+                    for i, (name, change) in enumerate(history.top("town.balance", 10, since=since), 1)
+                ]
+                embed = discord.Embed(
+                    title=f"📈 Balance growth, last {days} days",
+                    description="\n".join(lines) or "No history yet",
+                    color=0x2ecc71
+                )
+                await ctx.send(embed=embed)
+                return
             
-            embed.add_field(name="Attacker", value="AttackerNation", inline=True)
-            embed.add_field(name="Defender", value="DefenderTown", inline=True)
-            embed.add_field(name="Duration", value="24h", inline=True)
-            embed.add_field(name="War Chest", value="$2,000", inline=True)
-            embed.add_field(name="Banner Control", value="Attacker", inline=True)
-            embed.add_field(name="Status", value="Ongoing", inline=True)
-            
+            town = towny_index.find_town(town_name)
+            name = town.get('name', town_name) if town else town_name
+            embed = discord.Embed(title=f"📈 {name}, last {days} days", color=0x2ecc71)
+            for metric, label in (("town.balance", "Balance"), ("town.residents", "Residents"), ("town.claims", "Claims")):
+                points = history.range(metric, name, since)
+                if not points:
+                    continue
+                low = min(value for ts, value in points)
+                high = max(value for ts, value in points)
+                embed.add_field(
+                    name=label,
+                    value=f"{points[0][1]:,.0f} → {points[-1][1]:,.0f} (low {low:,.0f}, high {high:,.0f})",
+                    inline=False
+                )
+            if not embed.fields:
+                embed.description = "No history yet"
             await ctx.send(embed=embed)
         
+        @self.bot.command(name='profiler')
+        async def profiler_command(ctx, action=None):
+            """Start or stop the sampling profiler, stopping uploads the folded stacks"""
+            if not any(role.name in config['discord']['admin_roles'] for role in ctx.author.roles):
+                await ctx.send("❌ You don't have permission to use the profiler.")
+                return
+            
+            if action == "start":
+                profiler.start()
+                log_admin_action("Profiler start", str(ctx.author))
+                await ctx.send(f"🔬 Profiler running, sampling every {profiler.interval * 1000:.0f}ms")
+            elif action == "stop":
+                def stop():
+                    # Joins the sampler thread
+                    profiler.stop()
+                    return profiler.folded()
+                
+                folded = await asyncio.get_running_loop().run_in_executor(None, stop)
+                log_admin_action("Profiler stop", str(ctx.author))
+                await ctx.send(
+                    f"🔬 Profiler stopped after {profiler.samples} samples",
+                    file=discord.File(io.BytesIO(folded.encode('utf-8')), filename="profile.folded")
+                )
+            else:
+                await ctx.send("❌ Usage: `!profiler <start|stop>`")
+        
         @self.bot.command(name='admin_panel')
         async def admin_panel_link(ctx):
             """Get admin panel link"""
@@ -504,33 +1616,91 @@ class DiscordBot:
 
 # Auto-save function
 def auto_save():
-    while True:
-        time.sleep(config['towny']['auto_save'])
-        save_towny_data()
+    if save_towny_data():
         print("💾 Towny data auto-saved")
 
-# Main execution
-if __name__ == "__main__":
-    print("🚀 Starting Minecraft Towny Bot...")
+async def run_services():
+    """Run the web panel, auto-save, the Minecraft bot pool and the Discord bot on one event loop"""
+    global discord_bot
+    loop = asyncio.get_running_loop()
+    # Every blocking call (Flask requests, saves, bot connects) shares this pool
+    loop.set_default_executor(ThreadPoolExecutor(
+        max_workers=config['web_panel'].get('workers', 8),
+        thread_name_prefix="towny"
+    ))
+    
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
     
-    # Start web panel in a separate thread
-    web_thread = threading.Thread(target=run_web_panel, daemon=True)
-    web_thread.start()
+    # Web panel: SSE natively, everything else through Flask
+    web_app = web.Application()
+    web_app.router.add_get('/events', sse_handler(event_broker))
+    web_app.router.add_route('*', '/{path:.*}', WSGIHandler(app))
+    runner = web.AppRunner(web_app)
+    await runner.setup()
+    await web.TCPSite(runner, '0.0.0.0', config['web_panel']['port']).start()
     print(f"🌐 Web panel started on port {config['web_panel']['port']}")
     
-    # Start auto-save
-    save_thread = threading.Thread(target=auto_save, daemon=True)
-    save_thread.start()
-    print("💾 Auto-save enabled")
+    if metrics_config.get('profiler'):
+        profiler.start()
     
-    # Start Minecraft bot
-    mc_bot = MinecraftBot()
+    # Discord commands query the indexes on the loop, so load them before it starts
+    await asyncio.gather(*(loop.run_in_executor(None, server.index.build) for server in server_pool))
     
-    # Start Discord bot
+    for server in server_pool:
+        server.bot = MinecraftBot(server)
+        server.chat_queue.start()
+        server.ingestor.start()
     discord_bot = DiscordBot()
     
-    # Run Discord bot
+    scheduler.every(config['towny']['auto_save'], "auto_save", auto_save)
+    scheduler.every(ledger_config.get('flush_interval', 1.0), "ledger_flush", ledger.flush)
+    scheduler.every(config['minecraft'].get('health_interval', 30), "server_health", server_pool.check_health)
+    scheduler.every(history_config.get('interval', 300), "history_sample", sample_history)
+    # Sieges that were never scheduled (e.g. from before the scheduler existed)
+    for key, siege in towny_data.snapshot("sieges").items():
+        track_siege("sieges", key, siege)
+    
+    tasks = [
+        loop.create_task(scheduler.run()),
+        *[loop.create_task(server.bot.supervisor.run()) for server in server_pool],
+        loop.create_task(discord_bot.bot.start(config['discord']['token'])),
+        loop.create_task(stop.wait())
+    ]
+    print("💾 Auto-save enabled")
+    
     try:
-        discord_bot.bot.run(config['discord']['token'])
-    except Exception as e:
-        print(f"❌ Discord bot error: {e}")
\ No newline at end of file
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not task.cancelled() and task.exception():
+                print(f"❌ Service stopped: {task.exception()}")
+    finally:
+        print("🛑 Shutting down...")
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await discord_bot.bot.close()
+        for server in server_pool:
+            server.chat_queue.stop()
+            server.ingestor.stop()
+            server.bot.disconnect()
+        await runner.cleanup()
+        for server in server_pool:
+            await loop.run_in_executor(None, server.store.close)
+        await loop.run_in_executor(None, claim_index.save, claims_file)
+        await loop.run_in_executor(None, ledger.close)
+        await loop.run_in_executor(None, scheduler.save)
+        await loop.run_in_executor(None, history.save)
+        chat_log.close()
+        admin_log.close()
+        profiler.stop()
+        print("💾 Towny data saved")
+
+# Main execution
+if __name__ == "__main__":
+    print("🚀 Starting Minecraft Towny Bot...")
+    asyncio.run(run_services())
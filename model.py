@@ -0,0 +1,268 @@
+import sys
+import threading
+from array import array
+from collections.abc import Mapping
+
+# How a field is held in a record
+VALUE, REF, REFS = "value", "ref", "refs"
+_MISSING = object()
+
+
+class Names:
+    """Ids of the players, towns or nations of one store, and their names.
+
+    An entity gets an id the first time its name is seen and keeps it when
+    it is renamed. Records refer to other entities by id, so a player named
+    in a town's residents and in the players section is one id, and the
+    name itself is held only here. Ids are only meaningful within one
+    process and are never reused.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        self._lock = threading.Lock()
+
+    def intern(self, name):
+        """Id of name, added to the table if new"""
+        id = self.ids.get(name)
+        if id is None:
+            with self._lock:
+                id = self.ids.get(name)
+                if id is None:
+                    id = self.ids[name] = len(self.names)
+                    self.names.append(name)
+        return id
+
+    def canonical(self, name):
+        """The table's own copy of name, for sharing it as a dict key"""
+        return self.names[self.intern(name)]
+
+    def rename(self, old, new):
+        """Give old's id the name new, every record referring to it follows; returns the id"""
+        with self._lock:
+            if new in self.ids:
+                raise ValueError(f"'{new}' is already taken")
+            id = self.ids.pop(old)
+            self.ids[new] = id
+            self.names[id] = new
+        return id
+
+    def __getitem__(self, id):
+        return self.names[id]
+
+    def __len__(self):
+        return len(self.names)
+
+
+class Record:
+    """One entity with a fixed set of slots, read like the dict it came from.
+
+    Other entities are held as ids into the model's Names table for their
+    section (REF) or arrays of ids (REFS), other fields as plain values.
+    Fields outside the schema, or with a value of an unexpected type, go
+    to extra. record["nation"] and record.get() return names, so code
+    written against dicts keeps working; the slot attributes (nation_id,
+    allies_ids, ...) hold the ids.
+
+    Records are copy-on-write like the dicts they replace and compare by
+    identity, except that the names they return follow renames.
+    """
+
+    __slots__ = ("extra",)
+    # (key, kind, section of the entity a REF/REFS field refers to)
+    FIELDS = ()
+    names = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        slots = {REF: "{}_id", REFS: "{}_ids", VALUE: "{}"}
+        # Classes bound to a model (see Model) also keep each field's Names table
+        cls._fields = {
+            key: (kind, slots[kind].format(key), table, cls.names[table] if cls.names and table else None)
+            for key, kind, table in cls.FIELDS
+        }
+        cls._refs = {}
+        for kind, slot, table, names in cls._fields.values():
+            if table is not None:
+                cls._refs.setdefault(table, []).append((kind, slot))
+
+    @classmethod
+    def from_dict(cls, data):
+        record = cls.__new__(cls)
+        extra = None
+        fields = cls._fields
+        for key, value in data.items():
+            field = fields.get(key)
+            if field is not None:
+                kind, slot, table, names = field
+                if kind is VALUE:
+                    setattr(record, slot, sys.intern(value) if type(value) is str else value)
+                    continue
+                if kind is REF:
+                    if value is None:
+                        setattr(record, slot, None)
+                        continue
+                    if type(value) is str:
+                        id = names.ids.get(value)
+                        setattr(record, slot, names.intern(value) if id is None else id)
+                        continue
+                elif type(value) is list and all(type(name) is str for name in value):
+                    intern = names.intern
+                    setattr(record, slot, array('I', [intern(name) for name in value]))
+                    continue
+            if extra is None:
+                extra = {}
+            extra[key] = value
+        record.extra = extra
+        return record
+
+    def get(self, key, default=None):
+        field = self._fields.get(key)
+        if field is not None:
+            kind, slot, table, names = field
+            value = getattr(self, slot, _MISSING)
+            if value is not _MISSING:
+                if kind is VALUE:
+                    return value
+                names = names.names
+                if kind is REF:
+                    return None if value is None else names[value]
+                return [names[id] for id in value]
+        if self.extra is not None:
+            return self.extra.get(key, default)
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        field = self._fields.get(key)
+        if field is not None and hasattr(self, field[1]):
+            return True
+        return self.extra is not None and key in self.extra
+
+    def keys(self):
+        keys = [key for key, (kind, slot, table, names) in self._fields.items() if hasattr(self, slot)]
+        if self.extra:
+            keys.extend(self.extra)
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def to_dict(self):
+        return {key: self[key] for key in self.keys()}
+
+    def refers_to(self, table, id):
+        """Whether a REF/REFS field holds the id of an entity in table"""
+        for kind, slot in self._refs.get(table, ()):
+            value = getattr(self, slot, None)
+            if kind is REF:
+                if value == id:
+                    return True
+            elif value is not None and id in value:
+                return True
+        return False
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+Mapping.register(Record)
+
+
+class Player(Record):
+    __slots__ = ("town_id", "balance")
+    FIELDS = (("town", REF, "towns"), ("balance", VALUE, None))
+
+
+class Town(Record):
+    __slots__ = (
+        "name_id", "mayor_id", "balance", "residents_count", "residents_ids", "claims", "nation_id", "founded_date"
+    )
+    FIELDS = (
+        ("name", REF, "towns"), ("mayor", REF, "players"), ("balance", VALUE, None),
+        ("residents_count", VALUE, None), ("residents", REFS, "players"), ("claims", VALUE, None),
+        ("nation", REF, "nations"), ("founded_date", VALUE, None),
+    )
+
+
+class Nation(Record):
+    __slots__ = ("name_id", "king_id", "balance", "towns_count", "capital_id", "allies_ids", "enemies_ids")
+    FIELDS = (
+        ("name", REF, "nations"), ("king", REF, "players"), ("balance", VALUE, None),
+        ("towns_count", VALUE, None), ("capital", REF, "towns"), ("allies", REFS, "nations"),
+        ("enemies", REFS, "nations"),
+    )
+
+
+class Siege(Record):
+    __slots__ = ("attacker_id", "defender_id", "duration", "war_chest", "banner_control", "status")
+    FIELDS = (
+        ("attacker", REF, "nations"), ("defender", REF, "towns"), ("duration", VALUE, None),
+        ("war_chest", VALUE, None), ("banner_control", VALUE, None), ("status", VALUE, None),
+    )
+
+
+RECORDS = {"players": Player, "towns": Town, "nations": Nation, "sieges": Siege}
+# Entities that have ids; sieges are keyed by their defending town
+TABLES = ("players", "towns", "nations")
+KEY_TABLES = {"players": "players", "towns": "towns", "nations": "nations", "sieges": "towns"}
+
+
+def rename_references(section, value, table, old, new):
+    """Copy of a plain dict entity with references to old (an entity in table) renamed, None if it has none"""
+    renamed = None
+    for key, kind, field_table in RECORDS[section].FIELDS:
+        if field_table != table or key not in value:
+            continue
+        field = value[key]
+        if kind is REF and field == old:
+            field = new
+        elif kind is REFS and isinstance(field, list) and old in field:
+            field = [new if name == old else name for name in field]
+        else:
+            continue
+        if renamed is None:
+            renamed = dict(value)
+        renamed[key] = field
+    return renamed
+
+
+class Model:
+    """Record classes bound to one set of Names tables, one per TownyStore"""
+
+    def __init__(self):
+        self.names = {table: Names() for table in TABLES}
+        self.records = {
+            section: type(cls.__name__, (cls,), {"__slots__": (), "names": self.names})
+            for section, cls in RECORDS.items()
+        }
+
+    def record(self, section, value):
+        """Record for a decoded entity, anything that isn't a dict is kept as is"""
+        cls = self.records.get(section)
+        if cls is None or type(value) is not dict:
+            return value
+        return cls.from_dict(value)
+
+    def key(self, section, name):
+        """The shared copy of an entity's name, for keying its section"""
+        return self.names[KEY_TABLES[section]].canonical(name)
+
+    def rename(self, table, old, new):
+        """Rename a player, town or nation, returns its id"""
+        return self.names[table].rename(old, new)
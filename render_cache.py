@@ -0,0 +1,61 @@
+import threading
+from collections import OrderedDict
+
+
+class RenderCache:
+    """LRU cache of rendered output (embeds, HTML) keyed by (kind, key).
+
+    Each entry remembers the version it was built from; get() rebuilds when
+    the caller's current version differs. A version can be a counter or the
+    entity itself, since towny_data is copy-on-write any change to an entity
+    compares unequal. invalidate() drops entries early so deleted entities
+    don't sit in the cache.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def _count(self, kind, stat):
+        counts = self.stats.setdefault(kind, {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0})
+        counts[stat] += 1
+
+    def get(self, kind, key, version, build):
+        """Cached output for (kind, key) at version, calling build() on a miss"""
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end((kind, key))
+                self._count(kind, "hits")
+                return entry[1]
+            self._count(kind, "misses")
+        value = build()
+        with self._lock:
+            self._entries[(kind, key)] = (version, value)
+            self._entries.move_to_end((kind, key))
+            while len(self._entries) > self.max_entries:
+                (evicted_kind, _), _ = self._entries.popitem(last=False)
+                self._count(evicted_kind, "evictions")
+        return value
+
+    def invalidate(self, kind, key=None):
+        """Drop one entry, or every entry of a kind when key is None"""
+        with self._lock:
+            if key is not None:
+                if self._entries.pop((kind, key), None) is not None:
+                    self._count(kind, "invalidations")
+                return
+            for cache_key in [k for k in self._entries if k[0] == kind]:
+                del self._entries[cache_key]
+                self._count(kind, "invalidations")
+
+    def get_stats(self):
+        with self._lock:
+            stats = {kind: dict(counts) for kind, counts in self.stats.items()}
+            size = len(self._entries)
+        for counts in stats.values():
+            lookups = counts["hits"] + counts["misses"]
+            counts["hit_rate"] = counts["hits"] / lookups if lookups else 0.0
+        return {"size": size, "max_entries": self.max_entries, "kinds": stats}
@@ -0,0 +1,208 @@
+import asyncio
+import random
+import sys
+from urllib.parse import unquote
+
+from aiohttp import web
+
+from events import format_sse
+
+
+class Supervisor:
+    """Owns one connection lifecycle: a single reconnect attempt at a time
+    with exponential backoff and jitter.
+
+    connect is a blocking callable run in the executor that raises on failure.
+    request_reconnect() may be called from any thread, requests made while
+    an attempt is already running are folded into it.
+
+    A connect that returns can still fail later (mineflayer reports refused
+    and dropped connections through events), so the backoff only resets
+    when connected() confirms the connection is up, and every reconnect
+    waits backoff(attempt) first.
+    """
+
+    def __init__(self, name, connect, base_delay=5, max_delay=300):
+        self.name = name
+        self.connect = connect
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.connects = 0
+        self.attempt = 0
+        self._loop = None
+        self._wake = None
+
+    def request_reconnect(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def connected(self):
+        """The connection is up (e.g. the bot spawned), the next reconnect starts from the base delay"""
+        self.attempt = 0
+
+    def backoff(self, attempt):
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._wake.set()
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            if self.connects:
+                delay = self.backoff(self.attempt)
+                self.attempt += 1
+                print(f"🔌 {self.name} reconnecting in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                # Requests made while waiting are covered by this attempt
+                self._wake.clear()
+            while True:
+                try:
+                    await self._loop.run_in_executor(None, self.connect)
+                    break
+                except Exception as e:
+                    delay = self.backoff(self.attempt)
+                    self.attempt += 1
+                    print(f"❌ {self.name} connection failed: {e} (retrying in {delay:.0f}s)")
+                    await asyncio.sleep(delay)
+            self.connects += 1
+
+
+class WSGIHandler:
+    """Serve a WSGI app (the Flask panel) from aiohttp.
+
+    Requests run on the loop's executor, so the number of threads is fixed
+    by the executor size no matter how many requests come in.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def _environ(self, request, body):
+        host, port = (request.host.split(':', 1) + ['80'])[:2]
+        environ = {
+            'REQUEST_METHOD': request.method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': unquote(request.path, 'latin-1'),
+            'QUERY_STRING': request.query_string,
+            'CONTENT_TYPE': request.headers.get('Content-Type', ''),
+            'CONTENT_LENGTH': str(len(body)),
+            'SERVER_NAME': host,
+            'SERVER_PORT': port,
+            'SERVER_PROTOCOL': f"HTTP/{request.version.major}.{request.version.minor}",
+            'REMOTE_ADDR': request.remote or '',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': request.scheme,
+            'wsgi.input': _BytesInput(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for key, value in request.headers.items():
+            key = key.upper().replace('-', '_')
+            if key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                continue
+            name = f"HTTP_{key}"
+            environ[name] = f"{environ[name]},{value}" if name in environ else value
+        return environ
+
+    async def __call__(self, request):
+        loop = asyncio.get_running_loop()
+        body = await request.read()
+        environ = self._environ(request, body)
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = status
+            started['headers'] = headers
+
+        def call_app():
+            result = self.wsgi_app(environ, start_response)
+            return result, iter(result)
+
+        result, chunks = await loop.run_in_executor(None, call_app)
+        code, _, reason = started['status'].partition(' ')
+        response = web.StreamResponse(status=int(code), reason=reason)
+        for name, value in started['headers']:
+            response.headers.add(name, value)
+        try:
+            await response.prepare(request)
+            while True:
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await response.write(chunk)
+        finally:
+            if hasattr(result, 'close'):
+                await loop.run_in_executor(None, result.close)
+        await response.write_eof()
+        return response
+
+
+class _BytesInput:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self.data) - self.pos
+        chunk = self.data[self.pos:self.pos + size]
+        self.pos += len(chunk)
+        return chunk
+
+    def readline(self, size=-1):
+        end = self.data.find(b'\n', self.pos) + 1 or len(self.data)
+        if size is not None and size >= 0:
+            end = min(end, self.pos + size)
+        chunk = self.data[self.pos:end]
+        self.pos = end
+        return chunk
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+
+def sse_handler(broker, keepalive=15):
+    """aiohttp handler streaming broker events without holding a thread per client"""
+
+    async def handler(request):
+        last_event_id = request.headers.get('Last-Event-ID') or request.query.get('last_event_id')
+        last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        sub = broker.subscribe(last_event_id)
+        sub.on_push = lambda: loop.call_soon_threadsafe(wake.set)
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+        try:
+            await response.prepare(request)
+            await response.write(b"retry: 3000\n\n")
+            while True:
+                wake.clear()
+                entries = sub.get(timeout=0)
+                if entries:
+                    await response.write(format_sse(entries).encode('utf-8'))
+                    continue
+                try:
+                    await asyncio.wait_for(wake.wait(), keepalive)
+                except asyncio.TimeoutError:
+                    await response.write(b": keepalive\n\n")
+        except ConnectionResetError:
+            pass
+        finally:
+            broker.unsubscribe(sub)
+        return response
+
+    return handler
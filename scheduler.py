@@ -0,0 +1,155 @@
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+
+from storage import atomic_write
+
+
+class Scheduler:
+    """Timed jobs in a heap, fired from the event loop.
+
+    A job is identified by (kind, key); scheduling it again replaces the
+    old deadline and cancelling it drops it. Replaced heap entries are left
+    in place and skipped when popped, so every operation is O(log n) and
+    the loop only ever touches jobs that are due.
+
+    Handlers registered with on(kind, handler) run in the default executor
+    as handler(key, payload). Jobs with persist=True are written to path
+    and rebuilt on startup; any that came due while the bot was down fire
+    straight away.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._heap = []
+        self._jobs = {}
+        self._handlers = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wake = None
+        self.dirty = False
+        self.fired = 0
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for when, kind, key, payload, interval in json.load(f):
+                    self._push(when, kind, key, payload, interval, True)
+
+    def on(self, kind, handler):
+        self._handlers[kind] = handler
+
+    def every(self, interval, kind, handler):
+        """Run handler() every interval seconds, not persisted"""
+        self.on(kind, lambda key, payload: handler())
+        self.schedule(time.time() + interval, kind, interval=interval, persist=False)
+
+    def _push(self, when, kind, key, payload, interval, persist):
+        entry = [when, next(self._seq), kind, key, payload, interval, persist]
+        self._jobs[(kind, key)] = entry
+        heapq.heappush(self._heap, entry)
+        if persist:
+            self.dirty = True
+        return entry
+
+    def schedule(self, when, kind, key=None, payload=None, interval=None, persist=True):
+        """Run the kind handler at epoch time when, replacing any pending (kind, key) job"""
+        with self._lock:
+            old = self._jobs.get((kind, key))
+            if old is not None and old[6]:
+                self.dirty = True
+            wake = not self._heap or when < self._heap[0][0]
+            self._push(when, kind, key, payload, interval, persist)
+        if wake:
+            self._poke()
+
+    def cancel(self, kind, key=None):
+        with self._lock:
+            entry = self._jobs.pop((kind, key), None)
+            if entry is not None and entry[6]:
+                self.dirty = True
+        return entry is not None
+
+    def due_at(self, kind, key=None):
+        entry = self._jobs.get((kind, key))
+        return entry[0] if entry else None
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def _poke(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def _pop_due(self, now):
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                if self._jobs.get((entry[2], entry[3])) is not entry:
+                    continue
+                del self._jobs[(entry[2], entry[3])]
+                if entry[6]:
+                    self.dirty = True
+                due.append(entry)
+            next_when = self._heap[0][0] if self._heap else None
+        return due, next_when
+
+    def _fire(self, entry):
+        when, seq, kind, key, payload, interval, persist = entry
+        handler = self._handlers.get(kind)
+        if handler is None:
+            print(f"⚠️ No handler for scheduled job {kind}")
+            return
+        try:
+            handler(key, payload)
+        except Exception as e:
+            print(f"❌ Scheduled job {kind} {key or ''} failed: {e}")
+        finally:
+            self.fired += 1
+            if interval:
+                with self._lock:
+                    # Keep the schedule unless the handler replaced it
+                    if (kind, key) not in self._jobs:
+                        self._push(max(when + interval, time.time()), kind, key, payload, interval, persist)
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return False
+        with self._lock:
+            self.dirty = False
+            jobs = [
+                [when, kind, key, payload, interval]
+                for when, seq, kind, key, payload, interval, persist in self._jobs.values() if persist
+            ]
+        try:
+            atomic_write(self.path, json.dumps(jobs, separators=(',', ':')).encode('utf-8'))
+        except Exception:
+            self.dirty = True
+            raise
+        return True
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        while True:
+            self._wake.clear()
+            due, next_when = self._pop_due(time.time())
+            for entry in due:
+                await self._loop.run_in_executor(None, self._fire, entry)
+            if due:
+                # Handlers may have scheduled earlier jobs
+                continue
+            if self.dirty:
+                try:
+                    await self._loop.run_in_executor(None, self.save)
+                except Exception as e:
+                    print(f"❌ Saving schedule failed: {e}")
+            timeout = 60 if next_when is None else min(max(next_when - time.time(), 0), 60)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
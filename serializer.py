@@ -0,0 +1,65 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+BACKENDS = ("orjson", "msgspec", "json")
+
+
+def _encode_default(obj):
+    """Encode objects with a to_dict() (model records) as their dict"""
+    to_dict = getattr(obj, "to_dict", None)
+    if to_dict is None:
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    return to_dict()
+
+
+def available_backends():
+    return [name for name, module in (("orjson", orjson), ("msgspec", msgspec), ("json", json)) if module]
+
+
+class Serializer:
+    """JSON encode/decode through the fastest installed library.
+
+    backend="auto" picks orjson, then msgspec, then the stdlib. compact=True
+    writes without indentation, which is what production saves should use.
+    Output is always bytes. Decoding always gives plain dicts and lists;
+    typed entities are the slotted records TownyStore builds from them.
+    """
+
+    def __init__(self, backend="auto", compact=True):
+        if backend == "auto":
+            backend = available_backends()[0]
+        if backend not in available_backends():
+            raise ValueError(f"Serializer backend '{backend}' is not installed")
+        self.backend = backend
+        self.compact = compact
+        if backend == "msgspec":
+            self._encoder = msgspec.json.Encoder(enc_hook=_encode_default)
+            self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, obj):
+        if self.backend == "orjson":
+            if self.compact:
+                return orjson.dumps(obj, default=_encode_default)
+            return orjson.dumps(obj, default=_encode_default, option=orjson.OPT_INDENT_2)
+        if self.backend == "msgspec":
+            data = self._encoder.encode(obj)
+            return data if self.compact else msgspec.json.format(data, indent=2)
+        if self.compact:
+            return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, default=_encode_default).encode('utf-8')
+        return json.dumps(obj, indent=2, ensure_ascii=False, default=_encode_default).encode('utf-8')
+
+    def loads(self, data):
+        if self.backend == "orjson":
+            return orjson.loads(data)
+        if self.backend == "msgspec":
+            return self._decoder.decode(data.encode('utf-8') if isinstance(data, str) else data)
+        return json.loads(data)
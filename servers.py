@@ -0,0 +1,123 @@
+import time
+from collections import OrderedDict
+
+from chat_queue import ChatQueue
+from indexes import TownyIndex
+from ingest import ChatIngestor
+
+
+class ServerState:
+    """Everything that belongs to one Minecraft server.
+
+    Each server has its own towny_data store and lookup index, its own
+    outbound chat queue and reply parser, so a slow or disconnected server
+    only ever backs up its own queue.
+    """
+
+    def __init__(self, name, settings, store):
+        self.name = name
+        self.settings = settings
+        self.store = store
+        self.index = TownyIndex(store)
+        self.bot = None
+        self.healthy = True
+        self.last_message = None
+        self.chat_queue = ChatQueue(
+            self.connected_bot,
+            rate=settings.get('chat_rate', 1.0),
+            burst=settings.get('chat_burst', 4),
+            max_size=settings.get('chat_queue_size', 500)
+        )
+        self.ingestor = ChatIngestor(store, reply_timeout=settings.get('reply_timeout', 1.0))
+        # Called with each message the chat queue sent (from its sender thread) or evicted
+        self.sent_listeners = [self.ingestor.command_sent]
+        self.dropped_listeners = []
+        self.chat_queue.on_sent = self.message_sent
+        self.chat_queue.on_dropped = self.message_dropped
+
+    def connected_bot(self):
+        """The mineflayer bot if it is connected, else None"""
+        if self.bot is not None and self.bot.connected:
+            return self.bot.bot
+        return None
+
+    def message_sent(self, message):
+        for listener in list(self.sent_listeners):
+            listener(message)
+
+    def message_dropped(self, message):
+        for listener in list(self.dropped_listeners):
+            listener(message)
+
+    def message_received(self, message):
+        self.last_message = time.time()
+        self.ingestor.feed(message)
+
+    def health(self):
+        return {
+            "connected": self.connected_bot() is not None,
+            "healthy": self.healthy,
+            "last_message": self.last_message,
+            "queue_depth": self.chat_queue.depth(),
+            "ingest_depth": self.ingestor.depth(),
+            "reconnects": self.bot.supervisor.connects if self.bot else 0
+        }
+
+
+class ServerPool:
+    """The servers this process is connected to, in config order.
+
+    The first server is the default for panel requests and Discord
+    channels that aren't mapped to a server.
+    """
+
+    def __init__(self, stale_after=300, max_backlog=0.8):
+        self.servers = OrderedDict()
+        self.channels = {}
+        self.stale_after = stale_after
+        self.max_backlog = max_backlog
+
+    def add(self, state):
+        self.servers[state.name] = state
+        channel = state.settings.get('channel')
+        if channel:
+            self.channels[channel] = state
+        return state
+
+    @property
+    def default(self):
+        return next(iter(self.servers.values()))
+
+    def get(self, name=None):
+        """Server by name, the default for None, KeyError if unknown"""
+        if not name:
+            return self.default
+        return self.servers[name]
+
+    def for_channel(self, channel_name):
+        return self.channels.get(channel_name, self.default)
+
+    def __iter__(self):
+        return iter(self.servers.values())
+
+    def __len__(self):
+        return len(self.servers)
+
+    def check_health(self):
+        """Mark servers unhealthy when disconnected, backed up or silent for too long"""
+        now = time.time()
+        for state in self:
+            problems = []
+            if state.connected_bot() is None:
+                problems.append("disconnected")
+            elif state.last_message and now - state.last_message > self.stale_after:
+                problems.append(f"silent for {now - state.last_message:.0f}s")
+            if state.chat_queue.depth() >= state.chat_queue.max_size * self.max_backlog:
+                problems.append(f"{state.chat_queue.depth()} messages queued")
+            healthy = not problems
+            if healthy != state.healthy:
+                print(f"✅ Server {state.name} is healthy" if healthy else f"⚠️ Server {state.name}: {', '.join(problems)}")
+            state.healthy = healthy
+
+    def health(self):
+        return {name: state.health() for name, state in self.servers.items()}
@@ -0,0 +1,362 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from model import RECORDS, TABLES, Model, Record, rename_references
+from serializer import Serializer
+
+SECTIONS = ("players", "towns", "nations", "sieges")
+
+
+def atomic_write(path, data):
+    """Write bytes to path so a crash leaves either the old or the new file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class TownyStore:
+    """Per-entity SQLite store for towny data.
+
+    Sections are loaded on first access and only entities marked dirty are
+    written back on save(), inside a single transaction.
+
+    Entities are copy-on-write: set()/update() always store a new dict and
+    never change one that was handed out, so readers and save() can use
+    what they got without holding the lock. Reading a whole section returns
+    a shallow snapshot.
+
+    With slotted=True entities are held as model records (see model.py)
+    instead of dicts; they read the same, are converted on every write and
+    refer to each other by id, so rename() does not copy them.
+
+    Locks: _db_lock guards the SQLite connection, lock guards the in-memory
+    state. When both are needed _db_lock is taken first.
+    """
+
+    def __init__(self, path='towny_data.db', legacy_path='towny_data.json', serializer=None, slotted=False):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.serializer = serializer or Serializer()
+        self.model = Model() if slotted else None
+        self._conn = None
+        self._sections = {}
+        self._dirty = {section: set() for section in SECTIONS}
+        self._listeners = []
+        self._changes = deque(maxlen=10000)
+        # version counts changes since this store was created, epoch tells
+        # one process's versions from another's
+        self.version = 0
+        self.epoch = f"{time.time_ns():x}"
+        self.last_save_bytes = 0
+        self.lock = threading.RLock()
+        self._db_lock = threading.RLock()
+        self._save_lock = threading.Lock()
+
+    # Connection / migration
+
+    def _connect(self):
+        if self._conn is not None:
+            return self._conn
+        with self._db_lock:
+            if self._conn is not None:
+                return self._conn
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entities ("
+                "section TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "PRIMARY KEY (section, key))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS admin_logs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, time TEXT, action TEXT, user TEXT)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn = conn
+            if not conn.execute("SELECT 1 FROM meta WHERE key = 'migrated'").fetchone():
+                self._migrate_legacy(conn)
+            return conn
+
+    def _migrate_legacy(self, conn):
+        legacy = {}
+        if self.legacy_path and os.path.exists(self.legacy_path):
+            try:
+                with open(self.legacy_path, 'rb') as f:
+                    legacy = self.serializer.loads(f.read())
+            except ValueError:
+                print(f"⚠️ Could not parse {self.legacy_path}, starting with empty data")
+        conn.execute("BEGIN")
+        try:
+            for section in SECTIONS:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO entities (section, key, value) VALUES (?, ?, ?)",
+                    [(section, key, self.serializer.dumps(value)) for key, value in legacy.get(section, {}).items()]
+                )
+            conn.executemany(
+                "INSERT INTO admin_logs (time, action, user) VALUES (?, ?, ?)",
+                [(log.get("time"), log.get("action"), log.get("user")) for log in legacy.get("admin_logs", [])]
+            )
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated', ?)", (str(time.time()),))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if legacy:
+            print(f"📦 Migrated {self.legacy_path} into {self.path}")
+
+    # Reads
+
+    def _entity(self, section, value):
+        """value as it is kept in memory, a record when slotted"""
+        if self.model is None or value is None:
+            return value
+        return self.model.record(section, value)
+
+    def load(self, section):
+        """Load a section into memory (once) and return the live dict, hold lock to iterate it"""
+        data = self._sections.get(section)
+        if data is not None:
+            return data
+        with self._db_lock:
+            with self.lock:
+                if section not in self._sections:
+                    rows = self._connect().execute(
+                        "SELECT key, value FROM entities WHERE section = ?", (section,)
+                    ).fetchall()
+                    loads = self.serializer.loads
+                    if self.model is None:
+                        self._sections[section] = {key: loads(value) for key, value in rows}
+                    else:
+                        record, intern = self.model.record, self.model.key
+                        self._sections[section] = {
+                            intern(section, key): record(section, loads(value)) for key, value in rows
+                        }
+                return self._sections[section]
+
+    def snapshot(self, section):
+        """Consistent shallow copy of a section"""
+        data = self.load(section)
+        with self.lock:
+            return dict(data)
+
+    def __getitem__(self, section):
+        if section not in SECTIONS:
+            raise KeyError(section)
+        return self.snapshot(section)
+
+    def get(self, section, default=None):
+        if section not in SECTIONS:
+            return default
+        return self.snapshot(section)
+
+    def get_entity(self, section, key):
+        """Fetch one entity without loading the rest of its section"""
+        data = self._sections.get(section)
+        if data is not None:
+            return data.get(key)
+        with self._db_lock:
+            row = self._connect().execute(
+                "SELECT value FROM entities WHERE section = ? AND key = ?", (section, key)
+            ).fetchone()
+        return self._entity(section, self.serializer.loads(row[0])) if row else None
+
+    def count(self, section):
+        data = self._sections.get(section)
+        if data is not None:
+            return len(data)
+        with self._db_lock:
+            return self._connect().execute(
+                "SELECT COUNT(*) FROM entities WHERE section = ?", (section,)
+            ).fetchone()[0]
+
+    def values(self, section):
+        return list(self.snapshot(section).values())
+
+    # Writes
+
+    def subscribe(self, listener):
+        """Call listener(section, key, value) after every change, value is None on delete"""
+        self._listeners.append(listener)
+
+    def _notify(self, section, key, value):
+        self.version += 1
+        self._changes.append((self.version, section, key))
+        for listener in self._listeners:
+            listener(section, key, value)
+
+    def changes_since(self, version, epoch):
+        """Return {section: set(keys)} changed after version, or None if the log doesn't reach back that far.
+
+        A version from another epoch (before a restart) always gets None.
+        """
+        with self.lock:
+            if epoch != self.epoch or version > self.version:
+                return None
+            if version == self.version:
+                return {}
+            if not self._changes or self._changes[0][0] > version + 1:
+                return None
+            changed = {}
+            for change_version, section, key in reversed(self._changes):
+                if change_version <= version:
+                    break
+                changed.setdefault(section, set()).add(key)
+            return changed
+
+    def set(self, section, key, value):
+        """Store value as the new entity, it must not be modified afterwards"""
+        data = self.load(section)
+        value = self._entity(section, value)
+        with self.lock:
+            data[key] = value
+            self._dirty[section].add(key)
+            self._notify(section, key, value)
+
+    def update(self, section, key, changes):
+        """Copy-on-write update of some fields, creates the entity if missing"""
+        data = self.load(section)
+        with self.lock:
+            value = dict(data.get(key) or {})
+            value.update(changes)
+            value = data[key] = self._entity(section, value)
+            self._dirty[section].add(key)
+            self._notify(section, key, value)
+            return value
+
+    def update_many(self, section, changes):
+        """update() for several entities at once, changes is {key: fields}"""
+        data = self.load(section)
+        with self.lock:
+            for key, fields in changes.items():
+                value = dict(data.get(key) or {})
+                value.update(fields)
+                value = data[key] = self._entity(section, value)
+                self._dirty[section].add(key)
+                self._notify(section, key, value)
+
+    def rename(self, section, old, new):
+        """Rename a player, town or nation, every entity referring to it follows.
+
+        With slotted records the rename is one update of the model's Names
+        table, every record holds the id and reads the new name from there.
+        Dicts are copied with the name replaced. Either way the entities
+        that mention it are marked dirty and notified, since rows on disk
+        hold names. A town's siege moves with it. Returns the number of
+        entities changed.
+        """
+        if section not in TABLES:
+            raise ValueError(f"Cannot rename {section}")
+        sections = {name: self.load(name) for name in SECTIONS}
+        with self.lock:
+            data = sections[section]
+            if old not in data:
+                raise KeyError(old)
+            if new in data:
+                raise ValueError(f"'{new}' already exists")
+            if self.model is not None:
+                # Raises if new is already the name of an id, before anything moved
+                id = self.model.rename(section, old, new)
+            moved = [(section, data.pop(old))]
+            if section == "towns" and old in sections["sieges"]:
+                moved.append(("sieges", sections["sieges"].pop(old)))
+            changed = set()
+            for moved_section, value in moved:
+                sections[moved_section][new] = value
+                changed.add((moved_section, new))
+                self._dirty[moved_section].add(old)
+                self._notify(moved_section, old, None)
+            for name, entities in sections.items():
+                if section not in RECORDS[name]._refs:
+                    continue
+                for key, value in entities.items():
+                    if self.model is None:
+                        renamed = rename_references(name, value, section, old, new) if isinstance(value, dict) else None
+                        if renamed is not None:
+                            entities[key] = renamed
+                            changed.add((name, key))
+                    elif isinstance(value, Record) and value.refers_to(section, id):
+                        changed.add((name, key))
+            for name, key in changed:
+                self._dirty[name].add(key)
+                self._notify(name, key, sections[name][key])
+            return len(changed)
+
+    def delete(self, section, key):
+        data = self.load(section)
+        with self.lock:
+            data.pop(key, None)
+            self._dirty[section].add(key)
+            self._notify(section, key, None)
+
+    def take_admin_logs(self):
+        """Remove and return admin logs imported from the legacy JSON file"""
+        with self._db_lock:
+            conn = self._connect()
+            rows = conn.execute("SELECT time, action, user FROM admin_logs ORDER BY id").fetchall()
+            if rows:
+                conn.execute("DELETE FROM admin_logs")
+        return [{"time": t, "action": a, "user": u} for t, a, u in rows]
+
+    def has_changes(self):
+        return any(self._dirty.values())
+
+    def save(self):
+        """Write dirty entities in one transaction.
+
+        The state lock is only held while collecting references to dirty
+        entities, encoding and writing happen without blocking writers.
+        """
+        with self._save_lock, self._db_lock:
+            conn = self._connect()
+            with self.lock:
+                if not self.has_changes():
+                    return 0
+                dirty, self._dirty = self._dirty, {section: set() for section in SECTIONS}
+                entities = []
+                for section, keys in dirty.items():
+                    data = self._sections.get(section, {})
+                    entities.extend((section, key, data.get(key)) for key in keys)
+            upserts, deletes = [], []
+            dumps = self.serializer.dumps
+            for section, key, value in entities:
+                if value is None:
+                    deletes.append((section, key))
+                else:
+                    upserts.append((section, key, dumps(value)))
+            try:
+                conn.execute("BEGIN")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO entities (section, key, value) VALUES (?, ?, ?)", upserts
+                )
+                conn.executemany("DELETE FROM entities WHERE section = ? AND key = ?", deletes)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                with self.lock:
+                    for section, keys in dirty.items():
+                        self._dirty[section] |= keys
+                raise
+            self.last_save_bytes = sum(len(value) for section, key, value in upserts)
+            return len(upserts) + len(deletes)
+
+    def export_json(self, path, compact=None):
+        """Dump the whole store to a JSON file atomically, compact defaults to the serializer's mode"""
+        serializer = self.serializer
+        if compact is not None and compact != serializer.compact:
+            serializer = Serializer(serializer.backend, compact)
+        data = {section: self.snapshot(section) for section in SECTIONS}
+        atomic_write(path, serializer.dumps(data))
+
+    def close(self):
+        self.save()
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None